@@ -2,34 +2,42 @@ import gradio as gr
 import os
 import subprocess
 import time
-from collections import deque
+from collections import deque, OrderedDict
 import shutil
 import re
-
+import sys
+import html
+import tempfile
+import statistics
+import threading
+import hashlib
+import select
+import struct
+import atexit
+import glob
+import zipfile
+import contextlib
+import queue
+import secrets
+import json
+import concurrent.futures
+import asyncio
+import itertools
+import bisect
+
+# Códigos de cor: ANSI (ESC[31m), escritos como texto ("\u001B[31m") ou sem o escape ("[31m").
+# O padrão começa pelo literal "[", o que deixa a busca bem mais rápida; os escapes antes do "["
+# (raros na saída atual do motor) são retirados antes, com replaces simples.
+ANSI_COLOR_RE = re.compile(r'\[[0-9;]*m')
+ANSI_ESCAPES = ("\x1b[", "\\u001B[", "\\u001b[")
 def format_colors(text):
     """Remove todos os códigos de cor e deixa apenas texto puro"""
-    import re
-    
-    # Remover qualquer código ANSI
-    ansi_pattern = r'\x1b\[[0-9;]*m|\[([0-9;]*)m'
-    text = re.sub(ansi_pattern, '', text)
-    
-    # Remover códigos unicode de escape
-    text = text.replace("\\u001B[31m", "")
-    text = text.replace("\\u001B[34m", "")
-    text = text.replace("\\u001B[32m", "")
-    text = text.replace("\\u001B[0m", "")
-    
-    # Remover códigos sem escape
-    text = text.replace("[31m", "")
-    text = text.replace("[34m", "")
-    text = text.replace("[32m", "")
-    text = text.replace("[0m", "")
-    
     # NÃO alterar os símbolos das aeronaves - deixar como estão
     # > e < são as aeronaves e devem aparecer normalmente
-    
-    return text
+    if "\x1b" in text or "\\u001" in text:
+        for escape in ANSI_ESCAPES:
+            text = text.replace(escape, "[")
+    return ANSI_COLOR_RE.sub("", text)
 
 def check_and_install_java():
     """Verifica se Java está instalado e tenta instalar se necessário"""
@@ -61,12 +69,8 @@ def check_and_install_java():
 java_available, java_message = check_and_install_java()
 print(f"Status do Java: {java_message}")
 
-# Criar pasta para armazenar as classes Java
-os.makedirs("combat_classes", exist_ok=True)
-
 # Templates de código para as aeronaves com altura dinâmica e novos atributos
 TEAM1_TEMPLATE = '''import java.util.ArrayList;
-import java.util.Random;
 
 /**
  * Time 1 - Configure sua aeronave!
@@ -97,7 +101,8 @@ import java.util.Random;
  * - Míssil nuclear: -N->
  */
 public class Team1Aircraft extends Aircraft {
-    private Random random = new Random();
+    // Sorteios: use o `random` herdado de Aircraft, que recebe a semente da batalha
+    // (mesma semente, mesmas aeronaves e mesma arena = mesma batalha)
     private int maxAltitude; // Armazena a altura máxima do campo
 
     public Team1Aircraft() {
@@ -216,12 +221,12 @@ public class Team1Aircraft extends Aircraft {
     public void radarScan(ArrayList<Projectile> projectiles, int enemyPosX, int enemyPosY) {
         // Implementação básica: apenas detecta projéteis próximos
         // Em uma implementação mais avançada, você poderia usar essas informações
-        // para ajustar seu movimento e evitar projéteis
+        // para ajustar seu movimento e evitar projéteis, lendo cada projétil pelos getters:
+        // for (Projectile p : projectiles) { p.getPosX(); p.getPosY(); p.getDirection(); p.getSpeed(); }
     }
 }'''
 
 TEAM2_TEMPLATE = '''import java.util.ArrayList;
-import java.util.Random;
 
 /**
  * Time 2 - Configure sua aeronave!
@@ -252,7 +257,8 @@ import java.util.Random;
  * - Míssil nuclear: <-N-
  */
 public class Team2Aircraft extends Aircraft {
-    private Random random = new Random();
+    // Sorteios: use o `random` herdado de Aircraft, que recebe a semente da batalha
+    // (mesma semente, mesmas aeronaves e mesma arena = mesma batalha)
     private int maxAltitude; // Armazena a altura máxima do campo
 
     public Team2Aircraft() {
@@ -371,13 +377,15 @@ public class Team2Aircraft extends Aircraft {
     public void radarScan(ArrayList<Projectile> projectiles, int enemyPosX, int enemyPosY) {
         // Implementação básica: apenas detecta projéteis próximos
         // Em uma implementação mais avançada, você poderia usar essas informações
-        // para ajustar seu movimento e evitar projéteis
+        // para ajustar seu movimento e evitar projéteis, lendo cada projétil pelos getters:
+        // for (Projectile p : projectiles) { p.getPosX(); p.getPosY(); p.getDirection(); p.getSpeed(); }
     }
 }'''
 
 # Código base das classes Aircraft e Projectile
 aircraft_code = """
 import java.util.ArrayList;
+import java.util.Random;
 
 public abstract class Aircraft {
     protected int health;  // Agora definido externamente
@@ -398,6 +406,10 @@ public abstract class Aircraft {
     protected int posY = 1;
     protected String symbol;
     protected static final int TOTAL_POINTS = 100;
+    // Sorteador das sementes das aeronaves, definido pelo BattleMain enquanto constrói os times
+    static final ThreadLocal<Random> seeds = new ThreadLocal<Random>();
+    // Gerador de números aleatórios da aeronave, semeado antes do construtor e dos campos do time
+    protected final Random random = new Random(nextSeed());
 
     public Aircraft(int speed, int fireRate, int maneuverability, int shotPower, int supersonicPower,
                     int missilePower, int defense, int stealthChance, int radar, int doubleShot,
@@ -424,6 +436,11 @@ public abstract class Aircraft {
         this.health = health;
     }
 
+    private static long nextSeed() {
+        Random sorteador = (Random) seeds.get();
+        return sorteador == null ? new Random().nextLong() : sorteador.nextLong();
+    }
+
     private void validateAttributes() {
         int total = speed + fireRate + maneuverability + shotPower + supersonicPower +
                    missilePower + defense + stealthChance + radar + doubleShot + nuclearPower;
@@ -466,13 +483,15 @@ public abstract class Aircraft {
 """
 
 projectile_code = """
+// Campos públicos: as classes dos times são carregadas por outro class loader (outro pacote em tempo de
+// execução) e o código dos times lê os projéteis pelos campos ou pelos getters.
 public class Projectile {
-    int posX;
-    int posY;
-    int direction;
-    int speed;
-    String symbol;
-    int power = 0;  // Poder do projétil, usado para dano personalizado
+    public int posX;
+    public int posY;
+    public int direction;
+    public int speed;
+    public String symbol;
+    public int power = 0;  // Poder do projétil, usado para dano personalizado
 
     public Projectile(int posX, int posY, int direction, int speed, String symbol) {
         this.posX = posX;
@@ -495,430 +514,3494 @@ public class Projectile {
         return (posX < 0 || posX >= screenWidth);
     }
 
+    public int getPosX() {
+        return posX;
+    }
+
+    public int getPosY() {
+        return posY;
+    }
+
+    public int getDirection() {
+        return direction;
+    }
+
+    public int getSpeed() {
+        return speed;
+    }
+
+    public String getSymbol() {
+        return symbol;
+    }
+
     public int getPower() {
         return power;
     }
 }
 """
 
-def run_battle(code1, code2, screen_width, battlefield_height, p1_start_pos, p2_start_pos, team1_health, team2_health):
-    # Verificar se Java está disponível
-    if not java_available:
-        yield f"""
-        <div style="padding:20px; background-color:#ffe6e6; border:2px solid #ff4444; border-radius:5px; margin:10px;">
-            <h3 style="color:#cc0000;">❌ Java não está disponível</h3>
-            <p>Este aplicativo requer Java para compilar e executar as aeronaves.</p>
-            <p><strong>Soluções:</strong></p>
-            <ul>
-                <li>Execute localmente com Java instalado</li>
-                <li>Use um ambiente Docker com Java</li>
-                <li>Aguarde enquanto tentamos instalar Java automaticamente...</li>
-            </ul>
-            <p><em>Status: {java_message}</em></p>
-        </div>
-        """
-        return
-    
-    # Caminhos dos arquivos Java
-    aircraft_path = "combat_classes/Aircraft.java"
-    projectile_path = "combat_classes/Projectile.java"
-    class1_path = "combat_classes/Team1Aircraft.java"
-    class2_path = "combat_classes/Team2Aircraft.java"
-    main_path = "combat_classes/BattleMain.java"
-
-    # Gerar o código do BattleMain com os parâmetros configuráveis
-    battle_main_code = f"""
+# Motor da batalha: compilado uma única vez, recebe os parâmetros da arena pela linha de comando
+battle_main_code = """
+import java.lang.management.ManagementFactory;
+import java.lang.management.ThreadMXBean;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.net.URL;
+import java.net.URLClassLoader;
 import java.util.ArrayList;
+import java.util.Arrays;
 import java.util.Iterator;
+import java.util.LinkedHashMap;
+import java.util.Locale;
 import java.util.Random;
+import java.nio.charset.StandardCharsets;
+
+public class BattleMain {
+    // Tempo de CPU gasto pelo código de um time em cada método chamado pelo motor
+    static class CallbackTimer {
+        static final String[] METHODS = {"radarScan", "move", "changeAltitude", "nuclearMissile",
+                                         "doubleShot", "specialMissile", "shootSupersonic", "shoot"};
+        static final int RADAR = 0, MOVE = 1, ALTITUDE = 2, NUCLEAR = 3, DOUBLE = 4, SPECIAL = 5,
+                         SUPERSONIC = 6, SHOOT = 7;
+        static final ThreadMXBean THREADS = ManagementFactory.getThreadMXBean();
+        static final boolean CPU_TIME = THREADS.isCurrentThreadCpuTimeSupported();
+
+        final long[] nanos = new long[METHODS.length];
+        final int[] calls = new int[METHODS.length];
+        final long turnBudget;
+        final long battleBudget;
+        long turnNanos;
+        long battleNanos;
+        long started;
+
+        CallbackTimer(long turnBudgetMillis, long battleBudgetMillis) {
+            turnBudget = turnBudgetMillis * 1000000L;
+            battleBudget = battleBudgetMillis * 1000000L;
+        }
 
-public class BattleMain {{
-    public static void main(String[] args) {{
-        // Definir a altura do campo como propriedade do sistema
-        System.setProperty("battlefield.height", "{battlefield_height}");
+        static long now() {
+            return CPU_TIME ? THREADS.getCurrentThreadCpuTime() : System.nanoTime();
+        }
 
-        Aircraft team1 = new Team1Aircraft();
-        Aircraft team2 = new Team2Aircraft();
+        // Inicia a medição; falso se o time já gastou o orçamento do turno e deve perder a ação
+        boolean start() {
+            if (turnExceeded()) {
+                return false;
+            }
+            started = now();
+            return true;
+        }
 
-        // Definir a vida inicial de cada aeronave
-        team1.setInitialHealth({team1_health});
-        team2.setInitialHealth({team2_health});
+        void stop(int method) {
+            long elapsed = now() - started;
+            nanos[method] += elapsed;
+            calls[method]++;
+            turnNanos += elapsed;
+            battleNanos += elapsed;
+        }
+
+        void newTurn() {
+            turnNanos = 0;
+        }
+
+        boolean turnExceeded() {
+            return turnNanos > turnBudget;
+        }
+
+        boolean battleExceeded() {
+            return battleNanos > battleBudget;
+        }
+
+        String report() {
+            StringBuilder report = new StringBuilder(String.format("%.1f ms", battleNanos / 1e6));
+            for (int i = 0; i < METHODS.length; i++) {
+                if (calls[i] > 0) {
+                    report.append(String.format(" | %s %.1f ms (%d)", METHODS[i], nanos[i] / 1e6, calls[i]));
+                }
+            }
+            return report.toString();
+        }
+
+        String toJson() {
+            StringBuilder json = new StringBuilder(String.format(Locale.ROOT, "{\\"ms\\":%.3f,\\"methods\\":{", battleNanos / 1e6));
+            String separator = "";
+            for (int i = 0; i < METHODS.length; i++) {
+                if (calls[i] > 0) {
+                    json.append(String.format(Locale.ROOT, "%s\\"%s\\":[%.3f,%d]", separator, METHODS[i], nanos[i] / 1e6, calls[i]));
+                    separator = ",";
+                }
+            }
+            return json.append("}}").toString();
+        }
+    }
+
+    // Saída da batalha. No formato "events" (padrão) cada turno vira um registro JSON por linha:
+    //   {"t":"start","v":2,"w":...,"h":...,"s":[símbolo1,símbolo2],"hp":[vida1,vida2]}
+    //   {"t":"turn","n":...,"k":1,"a":[[x1,y1],[x2,y2]],"hp":[...],"p":[[id,x,y,vx,símbolo],...],"x":[id,...],
+    //    "e":[[evento,time,valor],...]}
+    //   {"t":"out","text":...}  (prints dos times desde o registro anterior)
+    //   {"t":"end","winner":0|1|2,"reason":...,"turns":...,"seed":...,"clock":true|false,"cpu":[...],"stats":[...]}
+    // "clock" diz se o orçamento de CPU (relógio) mudou a batalha: a mesma semente pode não repeti-la.
+    // Os projéteis vão em quadros-chave ("k", a cada `keyframeInterval` turnos, com todos os projéteis
+    // visíveis) e em deltas: quem lê avança cada projétil conhecido em vx, remove os ids de "x" e aplica
+    // "p", que só traz projéteis novos ou que não seguiram o movimento previsto.
+    // No formato "text" o campo de batalha é impresso em ASCII, para acompanhar no terminal.
+    // No formato "stats" (sem ninguém assistindo) só saem os registros start e end, com as estatísticas.
+    // O registro tem um canal só dele: o System.out visto pelo código dos times é um buffer (TeamOutput)
+    // que sai como registro "out", então um print de um time nunca se passa por um registro do motor.
+    static class BattleLog {
+        static final int PROTOCOL_VERSION = 2;
+        static final int TEAM_OUTPUT_PER_TURN = 64 * 1024;
+
+        // Prints dos times entre dois registros, limitados a `limit` bytes (threads dos times também escrevem aqui)
+        static class TeamOutput extends OutputStream {
+            final ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+            final int limit;
+            long dropped = 0;
+
+            TeamOutput(int limit) {
+                this.limit = limit;
+            }
+
+            @Override
+            public synchronized void write(int b) {
+                if (buffer.size() < limit) {
+                    buffer.write(b);
+                } else {
+                    dropped++;
+                }
+            }
+
+            @Override
+            public synchronized void write(byte[] b, int off, int len) {
+                int n = Math.max(0, Math.min(len, limit - buffer.size()));
+                if (n > 0) {
+                    buffer.write(b, off, n);
+                }
+                dropped += len - n;
+            }
+
+            // Texto acumulado desde a última chamada ("" se nada foi impresso)
+            synchronized String take() {
+                String text = new String(buffer.toByteArray(), StandardCharsets.UTF_8);
+                if (dropped > 0) {
+                    text += "[... " + dropped + " bytes omitidos]\\n";
+                }
+                buffer.reset();
+                dropped = 0;
+                return text;
+            }
+        }
+
+        // Estatísticas de um time na batalha
+        static class TeamStats {
+            final int[] shots = new int[CallbackTimer.METHODS.length];
+            int hits;
+            int dodges;
+            int damage;
+
+            String report() {
+                int total = 0;
+                StringBuilder byType = new StringBuilder();
+                for (int i = 0; i < shots.length; i++) {
+                    if (shots[i] > 0) {
+                        byType.append(byType.length() > 0 ? ", " : " (").append(CallbackTimer.METHODS[i]).append(' ').append(shots[i]);
+                        total += shots[i];
+                    }
+                }
+                return "tiros " + total + (total > 0 ? byType + ")" : "") + " | acertos " + hits
+                        + " | esquivas " + dodges + " | dano causado " + damage;
+            }
+
+            String toJson() {
+                StringBuilder json = new StringBuilder("{\\"shots\\":{");
+                String separator = "";
+                for (int i = 0; i < shots.length; i++) {
+                    if (shots[i] > 0) {
+                        json.append(separator).append('"').append(CallbackTimer.METHODS[i]).append("\\":").append(shots[i]);
+                        separator = ",";
+                    }
+                }
+                return json.append("},\\"hits\\":").append(hits).append(",\\"dodges\\":").append(dodges)
+                        .append(",\\"damage\\":").append(damage).append('}').toString();
+            }
+        }
+
+        // O que o leitor do registro sabe de um projétil visível
+        static class Tracked {
+            final int id;
+            int x;
+            int y;
+            int velocity;
+            String symbol;
+            int turn;
+
+            Tracked(int id) {
+                this.id = id;
+            }
+        }
+
+        final PrintStream out;
+        final TeamOutput teamOutput = new TeamOutput(TEAM_OUTPUT_PER_TURN);
+        final boolean text;
+        final boolean headless;
+        final int width;
+        final int height;
+        final int keyframeInterval;
+        final StringBuilder events = new StringBuilder();
+        // Projectile não redefine equals/hashCode: chave por identidade, percorrida na ordem de criação
+        // (a lista "x" sai na mesma ordem em batalhas com a mesma semente)
+        final LinkedHashMap<Projectile, Tracked> tracked = new LinkedHashMap<>();
+        int nextId;
+        final TeamStats[] stats = {new TeamStats(), new TeamStats()};
+        // Ações ignoradas ou desclassificação por tempo de CPU: o resultado depende do relógio
+        boolean clock;
+        // Buffers reaproveitados a cada turno: o quadro inteiro sai em uma única escrita
+        final StringBuilder frame = new StringBuilder();
+        final String[][] cells;
+
+        BattleLog(PrintStream out, String format, int width, int height, int keyframeInterval) {
+            this.out = out;
+            this.text = format.equals("text");
+            this.headless = format.equals("stats");
+            this.width = width;
+            this.height = height;
+            this.keyframeInterval = Math.max(1, keyframeInterval);
+            this.cells = text ? new String[height][width] : null;
+        }
+
+        static String quote(String value) {
+            StringBuilder quoted = new StringBuilder("\\"");
+            for (int i = 0; i < value.length(); i++) {
+                char c = value.charAt(i);
+                if (c == '"' || c == '\\\\') {
+                    quoted.append('\\\\').append(c);
+                } else if (c < 0x20) {
+                    quoted.append(String.format("\\\\u%04x", (int) c));
+                } else {
+                    quoted.append(c);
+                }
+            }
+            return quoted.append('"').toString();
+        }
+
+        static String describe(String kind, int team, int value) {
+            if (kind.equals("nuke")) {
+                return "!!! Time " + team + " lançou um MISSIL NUCLEAR!";
+            } else if (kind.equals("double")) {
+                return (team == 1 ? ">>>" : "<<<") + " Time " + team + " disparou um TIRO DUPLO!";
+            } else if (kind.equals("nukehit")) {
+                return "!!! MISSIL NUCLEAR do Time " + (3 - team) + " atingiu o Time " + team + "!";
+            } else if (kind.equals("hit")) {
+                return "*** Aeronave do Time " + team + " atingida! -" + value + " pontos";
+            } else if (kind.equals("dodge")) {
+                return "--- Aeronave do Time " + team + " esquivou!";
+            } else if (kind.equals("radar")) {
+                return "... Radar do Time " + team + " detectou o projétil!";
+            }
+            return "... Time " + team + " excedeu o tempo de CPU do turno; ações restantes ignoradas";
+        }
 
-        Random random = new Random();
+        void start(Aircraft team1, Aircraft team2) {
+            if (!text) {
+                out.println("{\\"t\\":\\"start\\",\\"v\\":" + PROTOCOL_VERSION + ",\\"w\\":" + width + ",\\"h\\":" + height
+                        + ",\\"s\\":[" + quote(team1.symbol) + "," + quote(team2.symbol) + "],\\"hp\\":["
+                        + team1.getHealth() + "," + team2.getHealth() + "]}");
+            }
+        }
+
+        // Escreve os prints dos times acumulados antes do próximo registro
+        void flushTeamOutput() {
+            String printed = teamOutput.take();
+            if (printed.isEmpty() || headless) {
+                return;
+            } else if (text) {
+                out.append(printed);
+            } else {
+                out.append("{\\"t\\":\\"out\\",\\"text\\":").append(quote(printed)).append("}\\n");
+            }
+        }
+
+        void startTurn() {
+            events.setLength(0);
+            frame.setLength(0);
+            if (text) {
+                frame.append("\\n=== NOVO TURNO ===\\n");
+            }
+        }
+
+        // Tiro disparado por um time; `method` é o método do time que criou o projétil
+        void shot(int team, int method) {
+            stats[team - 1].shots[method]++;
+        }
+
+        // Evento do turno (tiro especial, acerto, esquiva...); no formato texto vira uma mensagem
+        void event(String kind, int team, int value) {
+            if (kind.equals("hit")) {
+                stats[2 - team].hits++;
+                stats[2 - team].damage += value;
+            } else if (kind.equals("dodge")) {
+                stats[team - 1].dodges++;
+            } else if (kind.equals("slow")) {
+                clock = true;
+            }
+
+            if (headless) {
+                return;
+            } else if (text) {
+                frame.append(describe(kind, team, value)).append('\\n');
+            } else {
+                events.append(events.length() > 0 ? ",[\\"" : "[\\"").append(kind).append("\\",")
+                        .append(team).append(',').append(value).append(']');
+            }
+        }
+
+        void endTurn(int turn, int p1PosX, Aircraft team1, int p2PosX, Aircraft team2, ArrayList<Projectile> visible) {
+            flushTeamOutput();
+            if (headless) {
+                return;
+            } else if (text) {
+                writeFrame(p1PosX, team1.getPositionY(), team1.symbol, team1.getHealth(),
+                           p2PosX, team2.getPositionY(), team2.symbol, team2.getHealth(), visible);
+            } else {
+                boolean keyframe = (turn - 1) % keyframeInterval == 0;
+                if (keyframe) {
+                    tracked.clear();
+                }
+
+                StringBuilder record = frame.append("{\\"t\\":\\"turn\\",\\"n\\":").append(turn)
+                        .append(keyframe ? ",\\"k\\":1" : "")
+                        .append(",\\"a\\":[[").append(p1PosX).append(',').append(team1.getPositionY())
+                        .append("],[").append(p2PosX).append(',').append(team2.getPositionY())
+                        .append("]],\\"hp\\":[").append(team1.getHealth()).append(',').append(team2.getHealth())
+                        .append("],\\"p\\":[");
+                String separator = "";
+                for (Projectile p : visible) {
+                    int velocity = p.direction * p.speed;
+                    Tracked t = tracked.get(p);
+                    boolean predicted = t != null && p.posX == t.x + t.velocity && p.posY == t.y
+                            && velocity == t.velocity && p.symbol == t.symbol;
+                    if (t == null) {
+                        t = new Tracked(nextId++);
+                        tracked.put(p, t);
+                    }
+                    t.x = p.posX;
+                    t.y = p.posY;
+                    t.velocity = velocity;
+                    t.symbol = p.symbol;
+                    t.turn = turn;
+                    if (!predicted) {
+                        record.append(separator).append('[').append(t.id).append(',').append(p.posX).append(',')
+                                .append(p.posY).append(',').append(velocity).append(',').append(quote(p.symbol)).append(']');
+                        separator = ",";
+                    }
+                }
+
+                // Projéteis que acertaram uma aeronave ou saíram do campo
+                record.append("],\\"x\\":[");
+                separator = "";
+                Iterator<Tracked> iterator = tracked.values().iterator();
+                while (iterator.hasNext()) {
+                    Tracked t = iterator.next();
+                    if (t.turn != turn) {
+                        record.append(separator).append(t.id);
+                        separator = ",";
+                        iterator.remove();
+                    }
+                }
+                out.append(record.append("],\\"e\\":[").append(events).append("]}\\n"));
+                out.flush();
+            }
+        }
+
+        // Desenha o campo de batalha em ASCII e escreve o turno inteiro de uma vez
+        void writeFrame(int x1, int y1, String symbol1, int health1, int x2, int y2, String symbol2, int health2,
+                        ArrayList<Projectile> visible) {
+            for (String[] row : cells) {
+                Arrays.fill(row, " ");
+            }
+
+            // Posicionar aeronaves e projéteis no campo de batalha sem cores
+            cells[y1][x1] = symbol1;  // Time 1
+            cells[y2][x2] = symbol2;  // Time 2
+            for (Projectile p : visible) {
+                cells[p.posY][p.posX] = p.symbol;
+            }
+
+            for (String[] row : cells) {
+                for (String cell : row) {
+                    frame.append(cell);
+                }
+                frame.append('\\n');
+            }
+
+            // Status de vida e posições das aeronaves
+            frame.append("Vida Time 1: ").append(health1).append(" | Vida Time 2: ").append(health2).append('\\n')
+                 .append("Posições - Time 1: (").append(x1).append(',').append(y1)
+                 .append(") | Time 2: (").append(x2).append(',').append(y2).append(")\\n");
+            out.append(frame);
+            out.flush();
+        }
+
+        void end(int winner, String reason, int turns, long seed, CallbackTimer timer1, CallbackTimer timer2) {
+            flushTeamOutput();
+            if (text) {
+                out.println("Semente: " + seed);
+                out.println("Tempo de CPU Time 1: " + timer1.report());
+                out.println("Tempo de CPU Time 2: " + timer2.report());
+                out.println("Estatísticas Time 1: " + stats[0].report());
+                out.println("Estatísticas Time 2: " + stats[1].report());
+                if (winner == 0) {
+                    out.println("*** Empate! " + reason + " ***");
+                } else {
+                    if (reason != null) {
+                        out.println("!!! " + reason);
+                    }
+                    out.println("*** Time " + winner + " venceu! ***");
+                }
+            } else {
+                out.println("{\\"t\\":\\"end\\",\\"winner\\":" + winner + ",\\"reason\\":"
+                        + (reason == null ? "null" : quote(reason)) + ",\\"turns\\":" + turns + ",\\"seed\\":" + seed
+                        + ",\\"clock\\":" + clock + ",\\"cpu\\":[" + timer1.toJson() + "," + timer2.toJson() + "],\\"stats\\":["
+                        + stats[0].toJson() + "," + stats[1].toJson() + "]}");
+            }
+            out.flush();
+        }
+    }
+
+    // Lê um parâmetro "nome=valor" da linha de comando
+    static String stringArg(String[] args, String name, String defaultValue) {
+        for (String arg : args) {
+            if (arg.startsWith(name + "=")) {
+                return arg.substring(name.length() + 1);
+            }
+        }
+        return defaultValue;
+    }
+
+    static int intArg(String[] args, String name, int defaultValue) {
+        String value = stringArg(args, name, null);
+        return value == null ? defaultValue : Integer.parseInt(value);
+    }
+
+    static long longArg(String[] args, String name, long defaultValue) {
+        String value = stringArg(args, name, null);
+        return value == null ? defaultValue : Long.parseLong(value);
+    }
+
+    // As aeronaves dos times são carregadas por nome, assim o motor é compilado uma única vez
+    static Aircraft loadAircraft(String className, ClassLoader loader) throws Exception {
+        try {
+            return (Aircraft) Class.forName(className, true, loader).getDeclaredConstructor().newInstance();
+        } catch (InvocationTargetException e) {
+            if (e.getCause() instanceof Exception) {
+                throw (Exception) e.getCause();
+            }
+            throw e;
+        }
+    }
+
+    // Executado avulso, "classes=pasta" carrega os times num class loader filho, como no BattleWorker:
+    // a mesma aeronave segue as mesmas regras de acesso nos dois caminhos
+    public static void main(String[] args) throws Exception {
+        String classes = stringArg(args, "classes", null);
+        if (classes == null) {
+            run(args, BattleMain.class.getClassLoader(), System.out);
+            return;
+        }
+        URLClassLoader loader = new URLClassLoader(new URL[] {new File(classes).toURI().toURL()},
+                                                   BattleMain.class.getClassLoader());
+        try {
+            run(args, loader, System.out);
+        } finally {
+            loader.close();
+        }
+    }
+
+    // Executa uma batalha; o BattleWorker passa um class loader descartável com as classes dos times
+    // O registro da batalha vai para `out`; o System.out do código dos times é trocado pelo buffer do registro
+    public static void run(String[] args, ClassLoader loader, PrintStream out) throws Exception {
+        // Parâmetros da arena recebidos do Python
+        int screenWidth = intArg(args, "width", 100);
+        int battlefieldHeight = intArg(args, "height", 3);
+        int p1PosX = intArg(args, "p1", 2);
+        int p2PosX = intArg(args, "p2", screenWidth - 2);
+        // Limites que garantem o fim da batalha mesmo quando nenhuma aeronave consegue abater a outra
+        int maxTurns = intArg(args, "turns", 2000);
+        int stalemateTurns = intArg(args, "stalemate", 200);
+        // Orçamento de CPU do código de cada time, por turno e pela batalha inteira (ms)
+        CallbackTimer timer1 = new CallbackTimer(intArg(args, "turnCpu", 50), intArg(args, "battleCpu", 5000));
+        CallbackTimer timer2 = new CallbackTimer(intArg(args, "turnCpu", 50), intArg(args, "battleCpu", 5000));
+
+        // Definir a altura do campo como propriedade do sistema
+        System.setProperty("battlefield.height", String.valueOf(battlefieldHeight));
+        BattleLog log = new BattleLog(out, stringArg(args, "format", "events"),
+                                      screenWidth, battlefieldHeight, intArg(args, "keyframe", 20));
+        System.setOut(new PrintStream(log.teamOutput, true, "UTF-8"));
+
+        // Todos os sorteios (do motor e das aeronaves) saem da semente da batalha, que vai no resultado.
+        // As aeronaves recebem a sua antes de construídas: sorteios no construtor também se repetem.
+        // Só o orçamento de CPU depende do relógio: código que estoura o tempo pode mudar o resultado.
+        long seed = longArg(args, "seed", new Random().nextLong());
+        Random random = new Random(seed);
+        Aircraft team1;
+        Aircraft team2;
+        Aircraft.seeds.set(random);
+        try {
+            team1 = loadAircraft("Team1Aircraft", loader);
+            team2 = loadAircraft("Team2Aircraft", loader);
+        } finally {
+            Aircraft.seeds.remove();
+        }
+
+        // Definir a vida inicial de cada aeronave
+        team1.setInitialHealth(intArg(args, "health1", 100));
+        team2.setInitialHealth(intArg(args, "health2", 100));
 
-        int p1PosX = {p1_start_pos};
-        int p2PosX = {p2_start_pos};
-        int screenWidth = {screen_width};
-        int battlefieldHeight = {battlefield_height};
         ArrayList<Projectile> projectiles = new ArrayList<>();
+        ArrayList<Projectile> visible = new ArrayList<>();
 
         // Inicializar as altitudes das naves em uma posição média do campo
         team1.posY = battlefieldHeight / 2;
         team2.posY = battlefieldHeight / 2;
-
-        while (team1.isAlive() && team2.isAlive()) {{
-            System.out.println("\\n=== NOVO TURNO ===");
-            System.out.flush();
-
-            String[][] battlefield = new String[battlefieldHeight][screenWidth];
-            for (int row = 0; row < battlefieldHeight; row++) {{
-                for (int i = 0; i < screenWidth; i++) {{
-                    battlefield[row][i] = " ";
-                }}
-            }}
+        log.start(team1, team2);
+
+        int turn = 0;
+        int turnsWithoutDamage = 0;
+        String draw = null;
+        int forfeit = 0;
+
+        while (team1.isAlive() && team2.isAlive()) {
+            if (turn >= maxTurns) {
+                draw = "limite de " + maxTurns + " turnos atingido";
+                break;
+            }
+            if (turnsWithoutDamage >= stalemateTurns) {
+                draw = "nenhum dano em " + stalemateTurns + " turnos";
+                break;
+            }
+            turn++;
+            int healthBeforeTurn = team1.getHealth() + team2.getHealth();
+            timer1.newTurn();
+            timer2.newTurn();
+
+            log.startTurn();
+            visible.clear();
 
             // Radar scan para detectar projéteis
-            team1.radarScan(projectiles, p2PosX, team2.getPositionY());
-            team2.radarScan(projectiles, p1PosX, team1.getPositionY());
+            if (timer1.start()) {
+                team1.radarScan(projectiles, p2PosX, team2.getPositionY());
+                timer1.stop(CallbackTimer.RADAR);
+            }
+            if (timer2.start()) {
+                team2.radarScan(projectiles, p1PosX, team1.getPositionY());
+                timer2.stop(CallbackTimer.RADAR);
+            }
 
             // Movimento das aeronaves
-            p1PosX += team1.move();
-            p2PosX += team2.move();
+            if (timer1.start()) {
+                p1PosX += team1.move();
+                timer1.stop(CallbackTimer.MOVE);
+            }
+            if (timer2.start()) {
+                p2PosX += team2.move();
+                timer2.stop(CallbackTimer.MOVE);
+            }
             p1PosX = Math.max(0, Math.min(screenWidth - 1, p1PosX));
             p2PosX = Math.max(0, Math.min(screenWidth - 1, p2PosX));
 
             // Mudança de altitude
-            team1.changeAltitude();
-            team2.changeAltitude();
+            if (timer1.start()) {
+                team1.changeAltitude();
+                timer1.stop(CallbackTimer.ALTITUDE);
+            }
+            if (timer2.start()) {
+                team2.changeAltitude();
+                timer2.stop(CallbackTimer.ALTITUDE);
+            }
             // Garantir que a altitude não exceda o novo tamanho do campo de batalha
             team1.posY = Math.min(team1.posY, battlefieldHeight - 1);
             team2.posY = Math.min(team2.posY, battlefieldHeight - 1);
 
             // Atirar para Time 1
-            if (random.nextInt(10) < team1.fireRate) {{
+            if (random.nextInt(10) < team1.fireRate && timer1.start()) {
                 Projectile shot = null;
                 int shotType = random.nextInt(100);
+                int method;
 
                 // Escolha aleatória do tipo de tiro baseado na probabilidade
-                if (shotType < 5 && team1.nuclearPower > 0) {{
+                if (shotType < 5 && team1.nuclearPower > 0) {
                     // Tiro nuclear (baixa probabilidade)
                     shot = team1.nuclearMissile(p1PosX, 1);
-                    if (shot != null) {{
-                        System.out.println("!!! Time 1 lançou um MISSIL NUCLEAR!");
-                    }}
-                }} else if (shotType < 15 && team1.doubleShot > 0) {{
+                    method = CallbackTimer.NUCLEAR;
+                    if (shot != null) {
+                        log.event("nuke", 1, 0);
+                    }
+                } else if (shotType < 15 && team1.doubleShot > 0) {
                     // Tiro duplo
                     shot = team1.doubleShot(p1PosX, 1);
-                    if (shot != null) {{
-                        System.out.println(">>> Time 1 disparou um TIRO DUPLO!");
+                    method = CallbackTimer.DOUBLE;
+                    if (shot != null) {
+                        log.event("double", 1, 0);
                         // Adicionar o segundo projétil em uma altitude diferente
                         int secAlt = team1.getSecondShotAltitude();
-                        if (secAlt >= 0 && secAlt < battlefieldHeight) {{
+                        if (secAlt >= 0 && secAlt < battlefieldHeight) {
                             projectiles.add(new Projectile(p1PosX, secAlt, 1, 1, "->", team1.doubleShotPower));
-                        }}
-                    }}
-                }} else if (shotType < 30) {{
+                        }
+                    }
+                } else if (shotType < 30) {
                     // Míssil especial
                     shot = team1.specialMissile(p1PosX, 1);
-                }} else if (shotType < 60) {{
+                    method = CallbackTimer.SPECIAL;
+                } else if (shotType < 60) {
                     // Tiro supersônico
                     shot = team1.shootSupersonic(p1PosX, 1);
-                }} else {{
+                    method = CallbackTimer.SUPERSONIC;
+                } else {
                     // Tiro normal
                     shot = team1.shoot(p1PosX, 1);
-                }}
+                    method = CallbackTimer.SHOOT;
+                }
+                timer1.stop(method);
 
-                if (shot != null) {{
+                if (shot != null) {
+                    log.shot(1, method);
                     // Garantir que a altitude do projétil não exceda o campo de batalha
                     shot.posY = Math.min(shot.posY, battlefieldHeight - 1);
                     projectiles.add(shot);
-                }}
-            }}
+                }
+            }
 
             // Atirar para Time 2
-            if (random.nextInt(10) < team2.fireRate) {{
+            if (random.nextInt(10) < team2.fireRate && timer2.start()) {
                 Projectile shot = null;
                 int shotType = random.nextInt(100);
+                int method;
 
                 // Escolha aleatória do tipo de tiro baseado na probabilidade
-                if (shotType < 5 && team2.nuclearPower > 0) {{
+                if (shotType < 5 && team2.nuclearPower > 0) {
                     // Tiro nuclear (baixa probabilidade)
                     shot = team2.nuclearMissile(p2PosX, -1);
-                    if (shot != null) {{
-                        System.out.println("!!! Time 2 lançou um MISSIL NUCLEAR!");
-                    }}
-                }} else if (shotType < 15 && team2.doubleShot > 0) {{
+                    method = CallbackTimer.NUCLEAR;
+                    if (shot != null) {
+                        log.event("nuke", 2, 0);
+                    }
+                } else if (shotType < 15 && team2.doubleShot > 0) {
                     // Tiro duplo
                     shot = team2.doubleShot(p2PosX, -1);
-                    if (shot != null) {{
-                        System.out.println("<<< Time 2 disparou um TIRO DUPLO!");
+                    method = CallbackTimer.DOUBLE;
+                    if (shot != null) {
+                        log.event("double", 2, 0);
                         // Adicionar o segundo projétil em uma altitude diferente
                         int secAlt = team2.getSecondShotAltitude();
-                        if (secAlt >= 0 && secAlt < battlefieldHeight) {{
+                        if (secAlt >= 0 && secAlt < battlefieldHeight) {
                             projectiles.add(new Projectile(p2PosX, secAlt, -1, 1, "<-", team2.doubleShotPower));
-                        }}
-                    }}
-                }} else if (shotType < 30) {{
+                        }
+                    }
+                } else if (shotType < 30) {
                     // Míssil especial
                     shot = team2.specialMissile(p2PosX, -1);
-                }} else if (shotType < 60) {{
+                    method = CallbackTimer.SPECIAL;
+                } else if (shotType < 60) {
                     // Tiro supersônico
                     shot = team2.shootSupersonic(p2PosX, -1);
-                }} else {{
+                    method = CallbackTimer.SUPERSONIC;
+                } else {
                     // Tiro normal
                     shot = team2.shoot(p2PosX, -1);
-                }}
+                    method = CallbackTimer.SHOOT;
+                }
+                timer2.stop(method);
 
-                if (shot != null) {{
+                if (shot != null) {
+                    log.shot(2, method);
                     // Garantir que a altitude do projétil não exceda o campo de batalha
                     shot.posY = Math.min(shot.posY, battlefieldHeight - 1);
                     projectiles.add(shot);
-                }}
-            }}
-
-            // Posicionar aeronaves no campo de batalha sem cores
-            battlefield[team1.getPositionY()][p1PosX] = team1.symbol;  // Time 1
-            battlefield[team2.getPositionY()][p2PosX] = team2.symbol;  // Time 2
+                }
+            }
 
             // Mover projéteis e verificar colisões
             Iterator<Projectile> iterator = projectiles.iterator();
-            while (iterator.hasNext()) {{
+            while (iterator.hasNext()) {
                 Projectile p = iterator.next();
                 p.move();
 
                 // Verificar colisões com Time 1
-                if (p.posX == p1PosX && p.posY == team1.getPositionY()) {{
+                if (p.posX == p1PosX && p.posY == team1.getPositionY()) {
                     int damage = 0;
 
                     // Verificar se o projétil tem poder personalizado
-                    if (p.getPower() > 0) {{
+                    if (p.getPower() > 0) {
                         damage = p.getPower();
-                    }} else if (p.symbol.contains("<-N-")) {{ // Míssil nuclear do Time 2
+                    } else if (p.symbol.contains("<-N-")) { // Míssil nuclear do Time 2
                         damage = team2.nuclearPower * 2;
-                        System.out.println("!!! MISSIL NUCLEAR do Time 2 atingiu o Time 1!");
-                    }} else if (p.symbol.contains("<=")) {{ // Tiro duplo do Time 2
+                        log.event("nukehit", 1, 0);
+                    } else if (p.symbol.contains("<=")) { // Tiro duplo do Time 2
                         damage = team2.doubleShotPower;
-                    }} else if (p.symbol.equals("<=")) {{
+                    } else if (p.symbol.equals("<=")) {
                         damage = team2.missilePower;
-                    }} else if (p.symbol.equals("<<")) {{
+                    } else if (p.symbol.equals("<<")) {
                         damage = team2.supersonicPower;
-                    }} else {{
+                    } else {
                         damage = team2.shotPower;
-                    }}
+                    }
 
-                    if (random.nextInt(100) >= team1.stealthChance) {{
+                    if (random.nextInt(100) >= team1.stealthChance) {
                         team1.takeDamage(damage);
-                        System.out.println("*** Aeronave do Time 1 atingida! -" + damage + " pontos");
-                    }} else {{
-                        System.out.println("--- Aeronave do Time 1 esquivou!");
-                        if (team1.radar > 0) {{
-                            System.out.println("... Radar do Time 1 detectou o projétil!");
-                        }}
-                    }}
+                        log.event("hit", 1, damage);
+                    } else {
+                        log.event("dodge", 1, 0);
+                        if (team1.radar > 0) {
+                            log.event("radar", 1, 0);
+                        }
+                    }
                     iterator.remove();
                     continue;
-                }}
+                }
 
                 // Verificar colisões com Time 2
-                if (p.posX == p2PosX && p.posY == team2.getPositionY()) {{
+                if (p.posX == p2PosX && p.posY == team2.getPositionY()) {
                     int damage = 0;
 
                     // Verificar se o projétil tem poder personalizado
-                    if (p.getPower() > 0) {{
+                    if (p.getPower() > 0) {
                         damage = p.getPower();
-                    }} else if (p.symbol.contains("-N->")) {{ // Míssil nuclear do Time 1
+                    } else if (p.symbol.contains("-N->")) { // Míssil nuclear do Time 1
                         damage = team1.nuclearPower * 2;
-                        System.out.println("!!! MISSIL NUCLEAR do Time 1 atingiu o Time 2!");
-                    }} else if (p.symbol.contains("=>")) {{ // Tiro duplo do Time 1
+                        log.event("nukehit", 2, 0);
+                    } else if (p.symbol.contains("=>")) { // Tiro duplo do Time 1
                         damage = team1.doubleShotPower;
-                    }} else if (p.symbol.equals("=>")) {{
+                    } else if (p.symbol.equals("=>")) {
                         damage = team1.missilePower;
-                    }} else if (p.symbol.equals(">>")) {{
+                    } else if (p.symbol.equals(">>")) {
                         damage = team1.supersonicPower;
-                    }} else {{
+                    } else {
                         damage = team1.shotPower;
-                    }}
+                    }
 
-                    if (random.nextInt(100) >= team2.stealthChance) {{
+                    if (random.nextInt(100) >= team2.stealthChance) {
                         team2.takeDamage(damage);
-                        System.out.println("*** Aeronave do Time 2 atingida! -" + damage + " pontos");
-                    }} else {{
-                        System.out.println("--- Aeronave do Time 2 esquivou!");
-                        if (team2.radar > 0) {{
-                            System.out.println("... Radar do Time 2 detectou o projétil!");
-                        }}
-                    }}
+                        log.event("hit", 2, damage);
+                    } else {
+                        log.event("dodge", 2, 0);
+                        if (team2.radar > 0) {
+                            log.event("radar", 2, 0);
+                        }
+                    }
                     iterator.remove();
                     continue;
-                }}
+                }
 
                 // Remover projéteis fora dos limites
-                if (p.isOutOfBounds(screenWidth)) {{
+                if (p.isOutOfBounds(screenWidth)) {
                     iterator.remove();
                     continue;
-                }}
-
-                // Mostrar projéteis no campo de batalha sem cores
-                if (p.posX >= 0 && p.posX < screenWidth && p.posY >= 0 && p.posY < battlefieldHeight) {{
-                    battlefield[p.posY][p.posX] = p.symbol;
-                }}
-            }}
-
-            // Mostrar campo de batalha
-            for (int row = 0; row < battlefieldHeight; row++) {{
-                for (int i = 0; i < screenWidth; i++) {{
-                    System.out.print(battlefield[row][i]);
-                }}
-                System.out.println();
-            }}
-
-            // Mostrar status de vida e posições das aeronaves
-            System.out.println("Vida Time 1: " + team1.getHealth() + " | Vida Time 2: " + team2.getHealth());
-            System.out.println("Posições - Time 1: (" + p1PosX + "," + team1.getPositionY() + ") | Time 2: (" + p2PosX + "," + team2.getPositionY() + ")");
-            System.out.flush();
-
-            // Pausa para visualização
-            try {{
-                Thread.sleep(200);
-            }} catch (InterruptedException e) {{
-                System.err.println("Erro na pausa: " + e.getMessage());
-            }}
-        }}
-
-        if (team1.isAlive()) {{
-            System.out.println("*** Time 1 venceu! ***");
-        }} else {{
-            System.out.println("*** Time 2 venceu! ***");
-        }}
-        System.out.flush();
-    }}
-}}"""
-
-    # Salvar os arquivos Java
-    with open(aircraft_path, "w") as f:
-        f.write(aircraft_code)
-    with open(projectile_path, "w") as f:
-        f.write(projectile_code)
-    with open(class1_path, "w") as f1:
-        f1.write(code1)
-    with open(class2_path, "w") as f2:
-        f2.write(code2)
-    with open(main_path, "w") as f_main:
-        f_main.write(battle_main_code)
+                }
+
+                // Projéteis que continuam no campo de batalha (não há quadros no modo sem exibição)
+                if (!log.headless && p.posX >= 0 && p.posX < screenWidth && p.posY >= 0 && p.posY < battlefieldHeight) {
+                    visible.add(p);
+                }
+            }
+
+            // Código lento perde as ações restantes do turno
+            if (timer1.turnExceeded()) {
+                log.event("slow", 1, 0);
+            }
+            if (timer2.turnExceeded()) {
+                log.event("slow", 2, 0);
+            }
+            log.endTurn(turn, p1PosX, team1, p2PosX, team2, visible);
+
+            if (team1.getHealth() + team2.getHealth() == healthBeforeTurn) {
+                turnsWithoutDamage++;
+            } else {
+                turnsWithoutDamage = 0;
+            }
+
+            // Acima do orçamento de CPU da batalha, o time perde a batalha
+            if (timer1.battleExceeded() || timer2.battleExceeded()) {
+                forfeit = timer1.battleNanos - timer1.battleBudget >= timer2.battleNanos - timer2.battleBudget ? 1 : 2;
+                break;
+            }
+        }
 
+        if (forfeit != 0) {
+            log.clock = true;
+            log.end(3 - forfeit, "Time " + forfeit + " excedeu o limite de CPU da batalha e foi desclassificado",
+                    turn, seed, timer1, timer2);
+        } else if (draw != null) {
+            log.end(0, draw, turn, seed, timer1, timer2);
+        } else {
+            log.end(team1.isAlive() ? 1 : 2, null, turn, seed, timer1, timer2);
+        }
+    }
+}"""
+
+# Micro-benchmark do desenho do campo de batalha no formato texto (python app.py --bench-render):
+# quadros por segundo do BattleLog atual e do desenho anterior, célula a célula
+render_benchmark_code = """import java.io.OutputStream;
+import java.io.PrintStream;
+import java.util.ArrayList;
+import java.util.Random;
+
+public class RenderBenchmark {
+    static final String[] SYMBOLS = {"->", ">>", "=>", "-N->", "<-", "<<", "<=", "<-N-"};
+    static final int[][] ARENAS = {{200, 7}, {1000, 50}, {5000, 200}};
+
+    // Desenho anterior ao BattleLog.writeFrame: uma matriz nova por turno e um print por célula
+    static void legacyFrame(PrintStream out, int width, int height, int x1, int y1, int x2, int y2,
+                            ArrayList<Projectile> visible) {
+        out.println("\\n=== NOVO TURNO ===");
+        out.flush();
+
+        String[][] battlefield = new String[height][width];
+        for (int row = 0; row < height; row++) {
+            for (int i = 0; i < width; i++) {
+                battlefield[row][i] = " ";
+            }
+        }
+        battlefield[y1][x1] = "▶";
+        battlefield[y2][x2] = "◀";
+        for (Projectile p : visible) {
+            battlefield[p.posY][p.posX] = p.symbol;
+        }
+
+        for (int row = 0; row < height; row++) {
+            for (int i = 0; i < width; i++) {
+                out.print(battlefield[row][i]);
+            }
+            out.println();
+        }
+        out.println("Vida Time 1: " + 100 + " | Vida Time 2: " + 100);
+        out.println("Posições - Time 1: (" + x1 + "," + y1 + ") | Time 2: (" + x2 + "," + y2 + ")");
+        out.flush();
+    }
+
+    public static void main(String[] args) {
+        double seconds = args.length > 0 ? Double.parseDouble(args[0]) : 1.0;
+        // Mesmo comportamento do System.out (autoflush), sem o custo do terminal
+        PrintStream sink = new PrintStream(OutputStream.nullOutputStream(), true);
+        Random random = new Random(0);
+
+        System.out.println("Arena        | atual (quadros/s) | célula a célula (quadros/s) | ganho");
+        for (int[] arena : ARENAS) {
+            int width = arena[0];
+            int height = arena[1];
+            int x1 = 2;
+            int x2 = width - 2;
+            int y = height / 2;
+            // Densidade de projéteis parecida com a de uma batalha real (~1 a cada 10 células)
+            ArrayList<Projectile> visible = new ArrayList<>();
+            for (int i = 0; i < width * height / 10; i++) {
+                visible.add(new Projectile(random.nextInt(width), random.nextInt(height), 1, 1,
+                                           SYMBOLS[random.nextInt(SYMBOLS.length)]));
+            }
+            BattleMain.BattleLog log = new BattleMain.BattleLog(sink, "text", width, height, 1);
+
+            double current = 0;
+            double legacy = 0;
+            // A primeira rodada só aquece o JIT
+            for (int round = 0; round < 2; round++) {
+                long start = System.nanoTime();
+                long deadline = start + (long) (seconds * 1e9);
+                int frames = 0;
+                while (System.nanoTime() < deadline) {
+                    log.startTurn();
+                    log.writeFrame(x1, y, "▶", 100, x2, y, "◀", 100, visible);
+                    frames++;
+                }
+                current = frames / ((System.nanoTime() - start) / 1e9);
+
+                start = System.nanoTime();
+                deadline = start + (long) (seconds * 1e9);
+                frames = 0;
+                while (System.nanoTime() < deadline) {
+                    legacyFrame(sink, width, height, x1, y, x2, y, visible);
+                    frames++;
+                }
+                legacy = frames / ((System.nanoTime() - start) / 1e9);
+            }
+            System.out.printf("%5d x %-4d | %17.0f | %27.0f | %4.1fx%n", width, height, current, legacy, current / legacy);
+        }
+    }
+}
+"""
+
+# JVM de batalha de longa duração: recebe uma batalha por linha no stdin
+# ("id<TAB>pasta<TAB>parâmetros...") e carrega as classes dos times em um class loader
+# descartável. Ao final escreve "id FIM status tamanho omitidos" seguido do stderr da batalha; o status 2
+# indica que o código dos times deixou threads ou ganchos de desligamento e o JVM deve ser descartado.
+battle_worker_code = """
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.IOException;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.Field;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+import java.util.Arrays;
+import java.util.HashSet;
+import java.util.Map;
+import java.util.Set;
+
+public class BattleWorker {
+    static final int MAX_STDERR = 64 * 1024;
+    static final int STATUS_ERROR = 1;
+    static final int STATUS_TAINTED = 2;
+    static final PrintStream DISCARD = new PrintStream(new OutputStream() {
+        @Override
+        public void write(int b) {
+        }
+    });
+
+    // Threads do grupo "main" e seus subgrupos, onde nascem as threads criadas pelo código dos times
+    // (as do próprio JVM ficam em outros grupos)
+    static Set<Thread> teamThreads() {
+        ThreadGroup main = Thread.currentThread().getThreadGroup();
+        Set<Thread> threads = new HashSet<>();
+        for (Thread t : Thread.getAllStackTraces().keySet()) {
+            ThreadGroup group = t.getThreadGroup();
+            if (group != null && main.parentOf(group)) {
+                threads.add(t);
+            }
+        }
+        return threads;
+    }
+
+    // Ganchos de desligamento registrados; -1 se o JDK não permite ler (sem --add-opens)
+    static int shutdownHooks() {
+        try {
+            Field hooks = Class.forName("java.lang.ApplicationShutdownHooks").getDeclaredField("hooks");
+            hooks.setAccessible(true);
+            Object registered = hooks.get(null);
+            return registered instanceof Map ? ((Map) registered).size() : -1;
+        } catch (Exception e) {
+            return -1;
+        }
+    }
+
+    // Guarda no máximo `limit` bytes do stderr de uma batalha e conta os descartados
+    static class BoundedOutputStream extends OutputStream {
+        final ByteArrayOutputStream buffer = new ByteArrayOutputStream();
+        final int limit;
+        long dropped = 0;
+
+        BoundedOutputStream(int limit) {
+            this.limit = limit;
+        }
+
+        @Override
+        public void write(int b) {
+            if (buffer.size() < limit) {
+                buffer.write(b);
+            } else {
+                dropped++;
+            }
+        }
+
+        @Override
+        public void write(byte[] b, int off, int len) {
+            int n = Math.max(0, Math.min(len, limit - buffer.size()));
+            if (n > 0) {
+                buffer.write(b, off, n);
+            }
+            dropped += len - n;
+        }
+    }
+
+    public static void main(String[] args) throws IOException {
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        // O stdout do processo é só do protocolo; o System.out dos times é o buffer de cada batalha
+        PrintStream out = System.out;
+        PrintStream err = System.err;
+        System.setOut(DISCARD);
+
+        String request;
+        while ((request = in.readLine()) != null) {
+            String[] fields = request.split("\\t");
+            String id = fields[0];
+            URL workspace = new File(fields[1]).toURI().toURL();
+            String[] battleArgs = Arrays.copyOfRange(fields, 2, fields.length);
+
+            BoundedOutputStream errors = new BoundedOutputStream(MAX_STDERR);
+            System.setErr(new PrintStream(errors, true));
+            Set<Thread> threadsBefore = teamThreads();
+            int hooksBefore = shutdownHooks();
+            int status = 0;
+            URLClassLoader loader = new URLClassLoader(new URL[] {workspace}, BattleWorker.class.getClassLoader());
+            try {
+                BattleMain.run(battleArgs, loader, out);
+            } catch (Throwable t) {
+                status = STATUS_ERROR;
+                t.printStackTrace();
+            } finally {
+                // Descartar o class loader libera as classes dos times (metaspace)
+                loader.close();
+                // Entre batalhas, o que ainda for impresso pelo código dos times é descartado
+                System.setOut(DISCARD);
+                System.setErr(err);
+            }
+
+            // Threads ou ganchos deixados pelo código dos times alcançariam as próximas batalhas deste JVM
+            // (escrevendo na saída delas ou chamando System.exit no meio); o JVM é descartado depois desta
+            Set<Thread> leftover = teamThreads();
+            leftover.removeAll(threadsBefore);
+            if (!leftover.isEmpty() || shutdownHooks() != hooksBefore) {
+                status = STATUS_TAINTED;
+            }
+
+            byte[] stderr = errors.buffer.toByteArray();
+            out.print(id + " FIM " + status + " " + stderr.length + " " + errors.dropped + "\\n");
+            out.write(stderr, 0, stderr.length);
+            out.flush();
+        }
+    }
+}
+"""
+
+# Servidor de compilação: um JVM de longa duração que usa o javax.tools do JDK
+# com um gerenciador de arquivos em memória. Protocolo binário via stdin/stdout:
+# strings e blocos de bytes são enviados como (int de 4 bytes com o tamanho + dados).
+compile_server_code = """
+import javax.tools.Diagnostic;
+import javax.tools.DiagnosticCollector;
+import javax.tools.FileObject;
+import javax.tools.ForwardingJavaFileManager;
+import javax.tools.JavaCompiler;
+import javax.tools.JavaFileManager;
+import javax.tools.JavaFileObject;
+import javax.tools.SimpleJavaFileObject;
+import javax.tools.StandardJavaFileManager;
+import javax.tools.StandardLocation;
+import javax.tools.ToolProvider;
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.File;
+import java.io.IOException;
+import java.io.OutputStream;
+import java.net.URI;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.LinkedHashMap;
+import java.util.List;
+import java.util.Locale;
+import java.util.Map;
+
+public class CompileServer {
+    // Código-fonte mantido em memória
+    static class SourceFile extends SimpleJavaFileObject {
+        final String code;
+
+        SourceFile(String fileName, String code) {
+            super(URI.create("string:///" + fileName), JavaFileObject.Kind.SOURCE);
+            this.code = code;
+        }
+
+        @Override
+        public CharSequence getCharContent(boolean ignoreEncodingErrors) {
+            return code;
+        }
+    }
+
+    // Bytecode gerado, também em memória
+    static class ClassFile extends SimpleJavaFileObject {
+        final ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+
+        ClassFile(String className) {
+            super(URI.create("mem:///" + className.replace('.', '/') + ".class"), JavaFileObject.Kind.CLASS);
+        }
+
+        @Override
+        public OutputStream openOutputStream() {
+            return bytes;
+        }
+    }
+
+    static class MemoryFileManager extends ForwardingJavaFileManager<StandardJavaFileManager> {
+        final Map<String, ClassFile> classes = new LinkedHashMap<>();
+
+        MemoryFileManager(StandardJavaFileManager fileManager) {
+            super(fileManager);
+        }
+
+        @Override
+        public JavaFileObject getJavaFileForOutput(JavaFileManager.Location location, String className,
+                                                   JavaFileObject.Kind kind, FileObject sibling) {
+            ClassFile file = new ClassFile(className);
+            classes.put(className, file);
+            return file;
+        }
+    }
+
+    public static void main(String[] args) throws IOException {
+        DataInputStream in = new DataInputStream(new BufferedInputStream(System.in));
+        DataOutputStream out = new DataOutputStream(new BufferedOutputStream(System.out));
+
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            // JRE sem o módulo jdk.compiler: o Python volta a usar o javac
+            writeString(out, "NO_COMPILER");
+            out.flush();
+            return;
+        }
+        StandardJavaFileManager standard = compiler.getStandardFileManager(null, Locale.ROOT, StandardCharsets.UTF_8);
+        writeString(out, "READY");
+        out.flush();
+
+        while (true) {
+            String command;
+            try {
+                command = readString(in);
+            } catch (EOFException e) {
+                return; // O processo Python foi encerrado
+            }
+
+            if (command.equals("PING")) {
+                writeString(out, "PONG");
+            } else if (command.equals("COMPILE")) {
+                compile(in, out, compiler, standard);
+            } else {
+                writeString(out, "ERRO: comando desconhecido " + command);
+            }
+            out.flush();
+        }
+    }
+
+    static void compile(DataInputStream in, DataOutputStream out, JavaCompiler compiler,
+                        StandardJavaFileManager standard) throws IOException {
+        String classPath = readString(in);
+        int count = in.readInt();
+        List<SourceFile> sources = new ArrayList<>();
+        for (int i = 0; i < count; i++) {
+            String fileName = readString(in);
+            sources.add(new SourceFile(fileName, readString(in)));
+        }
+
+        boolean ok;
+        StringBuilder report = new StringBuilder();
+        MemoryFileManager fileManager = new MemoryFileManager(standard);
+        try {
+            List<File> classPathFiles = new ArrayList<>();
+            for (String entry : classPath.split(File.pathSeparator)) {
+                if (!entry.isEmpty()) {
+                    classPathFiles.add(new File(entry));
+                }
+            }
+            standard.setLocation(StandardLocation.CLASS_PATH, classPathFiles);
+
+            DiagnosticCollector<JavaFileObject> diagnostics = new DiagnosticCollector<>();
+            ok = compiler.getTask(null, fileManager, diagnostics, Arrays.asList("-proc:none"), null, sources).call();
+            for (Diagnostic<? extends JavaFileObject> d : diagnostics.getDiagnostics()) {
+                if (d.getKind() != Diagnostic.Kind.NOTE) {
+                    appendDiagnostic(report, d);
+                }
+            }
+        } catch (IOException | RuntimeException e) {
+            ok = false;
+            report.append("Erro interno do compilador: ").append(e).append('\\n');
+        }
+
+        writeString(out, ok ? "OK" : "ERRO");
+        writeString(out, report.toString());
+        if (!ok) {
+            out.writeInt(0);
+            return;
+        }
+        out.writeInt(fileManager.classes.size());
+        for (Map.Entry<String, ClassFile> entry : fileManager.classes.entrySet()) {
+            writeString(out, entry.getKey());
+            byte[] data = entry.getValue().bytes.toByteArray();
+            out.writeInt(data.length);
+            out.write(data);
+        }
+    }
+
+    // Formata no mesmo estilo do javac ("Arquivo.java:12: error: ...") para o Python agrupar por time
+    static void appendDiagnostic(StringBuilder report, Diagnostic<? extends JavaFileObject> d) {
+        String fileName = d.getSource() != null ? d.getSource().getName() : "?";
+        String kind = d.getKind() == Diagnostic.Kind.ERROR ? "error" : "warning";
+        report.append(fileName).append(':').append(d.getLineNumber()).append(": ")
+              .append(kind).append(": ").append(d.getMessage(Locale.ROOT)).append('\\n');
+
+        if (d.getSource() instanceof SourceFile && d.getLineNumber() > 0) {
+            String[] lines = ((SourceFile) d.getSource()).code.split("\\n", -1);
+            int index = (int) d.getLineNumber() - 1;
+            if (index < lines.length) {
+                report.append(lines[index].replace("\\r", "")).append('\\n');
+                for (long col = 1; col < d.getColumnNumber(); col++) {
+                    report.append(' ');
+                }
+                report.append("^\\n");
+            }
+        }
+    }
+
+    static String readString(DataInputStream in) throws IOException {
+        byte[] data = new byte[in.readInt()];
+        in.readFully(data);
+        return new String(data, StandardCharsets.UTF_8);
+    }
+
+    static void writeString(DataOutputStream out, String value) throws IOException {
+        byte[] data = value.getBytes(StandardCharsets.UTF_8);
+        out.writeInt(data.length);
+        out.write(data);
+    }
+}
+"""
+
+
+# Origem de cada arquivo compilado, usada para atribuir os erros do javac
+COMPILE_ORIGINS = {
+    "Team1Aircraft.java": "🟦 Time 1",
+    "Team2Aircraft.java": "🟥 Time 2",
+    "Aircraft.java": "⚙️ Motor do jogo (Aircraft)",
+    "Projectile.java": "⚙️ Motor do jogo (Projectile)",
+    "BattleMain.java": "⚙️ Motor do jogo (BattleMain)",
+}
+
+# Cabeçalho de uma mensagem do javac: "caminho/Arquivo.java:12: error: ..."
+JAVAC_DIAGNOSTIC_RE = re.compile(r'^(.*?\.java):(\d+): (?:error|warning|erro|aviso)')
+JAVAC_SUMMARY_RE = re.compile(r'^\d+ (?:errors?|warnings?|erros?|avisos?)$')
+
+def compile_java_batch(java_files, class_dir, classpath=None):
+    """Compila todos os arquivos de uma batalha em uma única execução do javac (até COMPILE_TIMEOUT segundos)"""
+    inicio = time.perf_counter()
     try:
-        # Compilar os arquivos Java
-        for java_file in [aircraft_path, projectile_path, class1_path, class2_path, main_path]:
-            compile_result = subprocess.run(["javac", "-cp", "combat_classes", "-d", "combat_classes", java_file], capture_output=True, text=True)
-            if compile_result.returncode != 0:
-                return f"❌ Erro na compilação:\\n{compile_result.stderr}"
+        result = subprocess.run(["javac", "-cp", classpath or class_dir, "-d", class_dir, *java_files],
+                                capture_output=True, text=True, timeout=COMPILE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return False, f"Tempo de compilação esgotado ({COMPILE_TIMEOUT} s)", time.perf_counter() - inicio
+    return result.returncode == 0, result.stderr, time.perf_counter() - inicio
+
+def group_compile_errors(stderr):
+    """Separa as mensagens do javac por origem (Time 1, Time 2 ou motor do jogo)"""
+    grupos = {}
+    origem = "Geral"
+    for line in stderr.splitlines():
+        match = JAVAC_DIAGNOSTIC_RE.match(line)
+        if match:
+            arquivo = os.path.basename(match.group(1))
+            origem = COMPILE_ORIGINS.get(arquivo, arquivo)
+        elif JAVAC_SUMMARY_RE.match(line.strip()):
+            continue
+        grupos.setdefault(origem, []).append(line)
+    return grupos
+
+def format_compile_errors(stderr):
+    """Monta o HTML com os erros de compilação agrupados por time"""
+    secoes = "".join(
+        f"""<h4>{origem}</h4>
+            <pre style="white-space:pre-wrap; background-color:#fff5f5; padding:10px;">{html.escape(chr(10).join(linhas))}</pre>"""
+        for origem, linhas in group_compile_errors(stderr).items()
+    )
+    return f"""
+        <div style="padding:20px; background-color:#ffe6e6; border:2px solid #ff4444; border-radius:5px; margin:10px;">
+            <h3 style="color:#cc0000;">❌ Erro na compilação</h3>
+            {secoes}
+        </div>
+        """
+
+# Servidor de compilação aquecido (javax.tools) usado por todas as batalhas
+COMPILE_SERVER_DIR = "compile_server"
+COMPILE_TIMEOUT = 30           # segundos para uma compilação no servidor
+DAEMON_START_TIMEOUT = 30      # segundos para o JVM do servidor ficar pronto
+DAEMON_HEALTH_INTERVAL = 30    # segundos entre verificações de saúde
+DAEMON_MAX_FAILURES = 3        # falhas seguidas antes de pausar o servidor
+DAEMON_RETRY_DELAY = 60        # segundos usando apenas o javac após falhas seguidas
+DAEMON_LOCK_TIMEOUT = 5        # segundos esperando outra compilação no servidor antes de usar o javac
+
+class CompileDaemonUnavailable(Exception):
+    """O servidor de compilação não pode ser usado; o chamador deve usar o javac"""
+
+class CompileDaemonTimeout(CompileDaemonUnavailable):
+    """O código esgotou o tempo de compilação no servidor; no javac ele esgotaria de novo"""
+
+class CompileDaemon:
+    """Mantém um JVM com o compilador do JDK já aquecido para compilar as batalhas"""
+
+    def __init__(self, class_dir=COMPILE_SERVER_DIR):
+        self.class_dir = class_dir
+        self.process = None
+        self.lock = threading.Lock()
+        self.supported = True      # False se o JDK não oferecer javax.tools
+        self.failures = 0
+        self.retry_after = 0.0
+        self.monitor = None
+
+    def _build(self):
+        """Compila o CompileServer.java, apenas quando o código mudou"""
+        os.makedirs(self.class_dir, exist_ok=True)
+        source_hash = hashlib.sha256(compile_server_code.encode("utf-8")).hexdigest()
+        stamp_path = os.path.join(self.class_dir, "CompileServer.sha256")
+        class_path = os.path.join(self.class_dir, "CompileServer.class")
+        if os.path.exists(class_path) and os.path.exists(stamp_path):
+            with open(stamp_path) as f:
+                if f.read().strip() == source_hash:
+                    return
+
+        source_path = os.path.join(self.class_dir, "CompileServer.java")
+        with open(source_path, "w", encoding="utf-8") as f:
+            f.write(compile_server_code)
+        ok, erros, _ = compile_java_batch([source_path], self.class_dir)
+        if not ok:
+            self.supported = False
+            raise CompileDaemonUnavailable(f"Falha ao compilar o servidor: {erros}")
+        with open(stamp_path, "w") as f:
+            f.write(source_hash)
+
+    def _start(self):
+        """Inicia o JVM do servidor e espera o sinal de pronto"""
+        self._build()
+        self.process = subprocess.Popen(
+            ["java", "-cp", self.class_dir, "CompileServer"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            bufsize=0
+        )
+        status = self._read_string(time.monotonic() + DAEMON_START_TIMEOUT)
+        if status == "NO_COMPILER":
+            self.supported = False
+            self._stop()
+            raise CompileDaemonUnavailable("JDK sem javax.tools disponível")
+        if status != "READY":
+            raise OSError(f"Resposta inesperada do servidor: {status!r}")
+
+    def _stop(self):
+        if self.process is not None:
+            try:
+                self.process.kill()
+                self.process.wait(timeout=5)
+            except Exception:
+                pass
+            self.process = None
+
+    def _running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _read_exact(self, size, deadline):
+        fd = self.process.stdout.fileno()
+        chunks = []
+        while size > 0:
+            restante = deadline - time.monotonic()
+            if restante <= 0 or not select.select([fd], [], [], restante)[0]:
+                raise TimeoutError("Servidor de compilação não respondeu a tempo")
+            chunk = os.read(fd, size)
+            if not chunk:
+                raise EOFError("Servidor de compilação encerrou")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def _read_bytes(self, deadline):
+        (size,) = struct.unpack(">i", self._read_exact(4, deadline))
+        return self._read_exact(size, deadline) if size else b""
+
+    def _read_string(self, deadline):
+        return self._read_bytes(deadline).decode("utf-8")
+
+    @staticmethod
+    def _pack_string(value):
+        data = value.encode("utf-8")
+        return struct.pack(">i", len(data)) + data
+
+    def _request(self, payload):
+        """Envia um pedido, (re)iniciando o servidor se ele tiver caído"""
+        if not self._running():
+            self._stop()
+            self._start()
+        self.process.stdin.write(payload)
+        self.process.stdin.flush()
+
+    def _call(self, func):
+        """Executa func com o servidor, reiniciando uma vez se ele falhar
+
+        Ocupado por outra compilação além de DAEMON_LOCK_TIMEOUT, o servidor é dado como indisponível e o
+        chamador usa o javac. Tempo esgotado não é repetido num JVM novo, e o de uma compilação
+        (CompileDaemonTimeout) também não vai para o javac: o mesmo código esgotaria o tempo de novo."""
+        if not self.supported or time.monotonic() < self.retry_after:
+            raise CompileDaemonUnavailable("Servidor de compilação indisponível")
+        if not self.lock.acquire(timeout=DAEMON_LOCK_TIMEOUT):
+            raise CompileDaemonUnavailable("Servidor de compilação ocupado")
+        try:
+            for _ in range(2):
+                try:
+                    result = func()
+                    self.failures = 0
+                    return result
+                except CompileDaemonTimeout:
+                    print("⚠️ Compilação esgotou o tempo no servidor; ele será reiniciado no próximo pedido")
+                    self._stop()
+                    raise
+                except (OSError, EOFError, TimeoutError, ValueError, struct.error) as e:
+                    print(f"⚠️ Servidor de compilação falhou: {e}")
+                    self._stop()
+                    self.failures += 1
+                    if self.failures >= DAEMON_MAX_FAILURES:
+                        self.retry_after = time.monotonic() + DAEMON_RETRY_DELAY
+                        self.failures = 0
+                        break
+                    if not self.supported or isinstance(e, TimeoutError):
+                        break
+        finally:
+            self.lock.release()
+        raise CompileDaemonUnavailable("Servidor de compilação indisponível")
+
+    def ping(self, timeout=2):
+        """Verificação de saúde: o servidor responde PONG?"""
+        def _ping():
+            deadline = time.monotonic() + timeout
+            self._request(self._pack_string("PING"))
+            if self._read_string(deadline) != "PONG":
+                raise ValueError("Resposta inválida ao PING")
+            return True
+        try:
+            return self._call(_ping)
+        except CompileDaemonUnavailable:
+            return False
+
+    def compile(self, sources, classpath="", timeout=COMPILE_TIMEOUT):
+        """Compila {arquivo: código} e retorna (ok, diagnósticos, {classe: bytecode})"""
+        payload = [self._pack_string("COMPILE"), self._pack_string(classpath), struct.pack(">i", len(sources))]
+        for nome, codigo in sources.items():
+            payload.append(self._pack_string(nome))
+            payload.append(self._pack_string(codigo))
+        payload = b"".join(payload)
+
+        def _compile():
+            self._request(payload)
+            deadline = time.monotonic() + timeout
+            try:
+                ok = self._read_string(deadline) == "OK"
+                diagnosticos = self._read_string(deadline)
+                (total,) = struct.unpack(">i", self._read_exact(4, deadline))
+                classes = {}
+                for _ in range(total):
+                    nome = self._read_string(deadline)
+                    classes[nome] = self._read_bytes(deadline)
+            except TimeoutError as e:
+                raise CompileDaemonTimeout(str(e))
+            return ok, diagnosticos, classes
+        return self._call(_compile)
+
+    def _monitor_loop(self):
+        while True:
+            time.sleep(DAEMON_HEALTH_INTERVAL)
+            if self.supported and not self.lock.locked() and not self.ping():
+                print("⚠️ Servidor de compilação não respondeu à verificação de saúde")
+
+    def warm_up(self):
+        """Inicia o servidor, aquece o JIT com os templates e liga o monitor de saúde"""
+        try:
+            self.compile({
+                "Aircraft.java": aircraft_code,
+                "Projectile.java": projectile_code,
+                "Team1Aircraft.java": TEAM1_TEMPLATE,
+                "Team2Aircraft.java": TEAM2_TEMPLATE,
+            })
+            print("Servidor de compilação pronto")
+        except CompileDaemonUnavailable as e:
+            print(f"Servidor de compilação indisponível, usando javac: {e}")
+        if self.supported and self.monitor is None:
+            self.monitor = threading.Thread(target=self._monitor_loop, daemon=True)
+            self.monitor.start()
+
+    def stop(self):
+        with self.lock:
+            self._stop()
+
+# Com --build-engine (build da imagem) o processo só empacota o motor e sai: sem JVMs em segundo plano,
+# que seriam interrompidos no meio e deixariam processos e arquivos temporários na camada da imagem
+BUILD_ENGINE_ONLY = __name__ == "__main__" and "--build-engine" in sys.argv
+
+compile_daemon = CompileDaemon()
+atexit.register(compile_daemon.stop)
+if java_available and not BUILD_ENGINE_ONLY:
+    threading.Thread(target=compile_daemon.warm_up, daemon=True).start()
+
+# Cache de classes compiladas dos times, endereçado pelo conteúdo do código
+CLASS_CACHE_DIR = "class_cache"
+CLASS_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CACHEABLE_SOURCES = ("Team1Aircraft.java", "Team2Aircraft.java")
+
+# Versão do motor: as classes dos times são compiladas contra Aircraft e Projectile
+ENGINE_VERSION = hashlib.sha256((aircraft_code + projectile_code).encode("utf-8")).hexdigest()[:16]
+
+# Literais de texto/caractere (preservados), comentários e espaços (normalizados)
+JAVA_TOKEN_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|(?://[^\n]*|/\*.*?\*/|\s)+', re.DOTALL)
+JAVA_TYPE_DECL_RE = re.compile(r'\b(?:class|interface|enum|record)\s+([A-Za-z_$][\w$]*)')
+
+def normalize_java_source(code):
+    """Remove comentários e colapsa espaços, preservando textos entre aspas"""
+    def _token(match):
+        token = match.group(0)
+        return token if token[0] in "\"'" else " "
+    return JAVA_TOKEN_RE.sub(_token, code).strip()
+
+def collect_class_files(code, class_dir):
+    """Lê de class_dir o bytecode dos tipos declarados em um arquivo-fonte"""
+    classes = {}
+    for tipo in set(JAVA_TYPE_DECL_RE.findall(normalize_java_source(code))):
+        for caminho in [os.path.join(class_dir, tipo + ".class"),
+                        *glob.glob(os.path.join(class_dir, glob.escape(tipo) + "$*.class"))]:
+            if os.path.exists(caminho):
+                with open(caminho, "rb") as f:
+                    classes[os.path.basename(caminho)[:-len(".class")]] = f.read()
+    return classes
+
+class CompiledClassCache:
+    """Cache LRU persistente de bytecode, limitado pelo total de bytes em disco"""
+
+    def __init__(self, cache_dir=CLASS_CACHE_DIR, max_bytes=CLASS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()   # chave -> tamanho em bytes, do menos ao mais recente
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.compiler_id = self._compiler_id()
+        self._load_index()
+
+    @staticmethod
+    def _compiler_id():
+        try:
+            result = subprocess.run(["javac", "-version"], capture_output=True, text=True)
+            return (result.stdout + result.stderr).strip()
+        except OSError:
+            return ""
+
+    def _load_index(self):
+        """Reconstrói o índice LRU a partir dos arquivos de uma execução anterior"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        arquivos = []
+        for nome in os.listdir(self.cache_dir):
+            if nome.endswith(".zip"):
+                stat = os.stat(os.path.join(self.cache_dir, nome))
+                arquivos.append((stat.st_mtime, nome[:-len(".zip")], stat.st_size))
+        for _, chave, tamanho in sorted(arquivos):
+            self.entries[chave] = tamanho
+            self.total_bytes += tamanho
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".zip")
+
+    def key(self, file_name, code):
+        dados = "\0".join([ENGINE_VERSION, self.compiler_id, file_name, normalize_java_source(code)])
+        return hashlib.sha256(dados.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Retorna {classe: bytecode} ou None"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            try:
+                with zipfile.ZipFile(self._path(key)) as z:
+                    classes = {nome[:-len(".class")]: z.read(nome) for nome in z.namelist()}
+            except (OSError, zipfile.BadZipFile):
+                self._remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            os.utime(self._path(key))
+            self.hits += 1
+            return classes
+
+    def put(self, key, classes):
+        if not classes:
+            return
+        with self.lock:
+            temporario = self._path(key) + ".tmp"
+            with zipfile.ZipFile(temporario, "w", zipfile.ZIP_DEFLATED) as z:
+                for nome, dados in classes.items():
+                    z.writestr(nome + ".class", dados)
+            os.replace(temporario, self._path(key))
+            if key in self.entries:
+                self.total_bytes -= self.entries[key]
+            self.entries[key] = os.path.getsize(self._path(key))
+            self.entries.move_to_end(key)
+            self.total_bytes += self.entries[key]
+            self._evict()
+
+    def _remove(self, key):
+        self.total_bytes -= self.entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._remove(next(iter(self.entries)))
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "entries": len(self.entries), "bytes": self.total_bytes}
+
+class_cache = CompiledClassCache()
+
+def write_class_files(classes, class_dir):
+    """Grava o bytecode retornado pelo servidor de compilação em class_dir"""
+    for nome, dados in classes.items():
+        caminho = os.path.join(class_dir, *nome.split(".")) + ".class"
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "wb") as f:
+            f.write(dados)
+
+def compile_sources(sources, class_dir, classpath=None):
+    """Compila {arquivo: código} no servidor aquecido, ou com o javac se ele estiver indisponível"""
+    inicio = time.perf_counter()
+    try:
+        ok, erros, classes = compile_daemon.compile(sources, classpath or class_dir)
+        if ok:
+            write_class_files(classes, class_dir)
+    except CompileDaemonTimeout:
+        ok, erros = False, f"Tempo de compilação esgotado ({COMPILE_TIMEOUT} s)"
+    except CompileDaemonUnavailable:
+        caminhos = []
+        for nome, codigo in sources.items():
+            caminho = os.path.join(class_dir, nome)
+            with open(caminho, "w") as f:
+                f.write(codigo)
+            caminhos.append(caminho)
+        ok, erros, _ = compile_java_batch(caminhos, class_dir, classpath)
+    return ok, erros, time.perf_counter() - inicio
+
+def compile_with_cache(sources, class_dir, classpath=None):
+    """Reaproveita do cache as classes dos times já compiladas e compila só o restante"""
+    inicio = time.perf_counter()
+    pendentes = {}
+    chaves = {}
+    for nome, codigo in sources.items():
+        if nome in CACHEABLE_SOURCES:
+            chave = class_cache.key(nome, codigo)
+            classes = class_cache.get(chave)
+            if classes is not None:
+                write_class_files(classes, class_dir)
+                continue
+            chaves[nome] = chave
+        pendentes[nome] = codigo
+
+    ok, erros = True, ""
+    if pendentes:
+        ok, erros, _ = compile_sources(pendentes, class_dir, classpath)
+        if ok:
+            for nome, chave in chaves.items():
+                class_cache.put(chave, collect_class_files(pendentes[nome], class_dir))
+    return ok, erros, time.perf_counter() - inicio
+
+# Motor do jogo (Aircraft, Projectile e BattleMain) empacotado uma única vez em um jar versionado
+ENGINE_DIR = "engine"
+ENGINE_SOURCES = {
+    "Aircraft.java": aircraft_code,
+    "Projectile.java": projectile_code,
+    "BattleMain.java": battle_main_code,
+    "BattleWorker.java": battle_worker_code,
+    "RenderBenchmark.java": render_benchmark_code,
+}
+ENGINE_SOURCE_HASH = hashlib.sha256("".join(ENGINE_SOURCES.values()).encode("utf-8")).hexdigest()
+ENGINE_JAR = os.path.join(ENGINE_DIR, f"air-combat-engine-{ENGINE_SOURCE_HASH[:12]}.jar")
 
-        # Executar a simulação
+def engine_jar_hash(jar_path):
+    """Lê o hash do código-fonte gravado dentro do jar do motor"""
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            return jar.read("engine.sha256").decode("ascii").strip()
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+def build_engine(jar_path=ENGINE_JAR):
+    """Gera o jar do motor, a menos que já exista um jar com o mesmo hash do código embutido"""
+    if engine_jar_hash(jar_path) == ENGINE_SOURCE_HASH:
+        return True, ""
+
+    os.makedirs(os.path.dirname(jar_path), exist_ok=True)
+    pasta = tempfile.mkdtemp(prefix="engine_build_")
+    try:
+        ok, erros, tempo = compile_sources(ENGINE_SOURCES, pasta)
+        if not ok:
+            return False, erros
+
+        temporario = jar_path + ".tmp"
+        with zipfile.ZipFile(temporario, "w", zipfile.ZIP_DEFLATED) as jar:
+            jar.writestr("META-INF/MANIFEST.MF",
+                         "Manifest-Version: 1.0\r\n"
+                         "Implementation-Title: Java Air Combat Engine\r\n"
+                         f"Implementation-Version: {ENGINE_SOURCE_HASH}\r\n"
+                         "Main-Class: BattleMain\r\n\r\n")
+            for classe in sorted(glob.glob(os.path.join(pasta, "**", "*.class"), recursive=True)):
+                jar.write(classe, os.path.relpath(classe, pasta).replace(os.sep, "/"))
+            jar.writestr("engine.sha256", ENGINE_SOURCE_HASH)
+        os.replace(temporario, jar_path)
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    # Descartar jars de versões anteriores do motor
+    for antigo in glob.glob(os.path.join(os.path.dirname(jar_path), "air-combat-engine-*.jar")):
+        if os.path.abspath(antigo) != os.path.abspath(jar_path):
+            os.remove(antigo)
+    print(f"Motor do jogo empacotado em {jar_path} ({tempo * 1000:.0f} ms)")
+    return True, ""
+
+if java_available:
+    engine_ready, engine_errors = build_engine()
+else:
+    engine_ready, engine_errors = False, java_message
+
+# Pastas de trabalho isoladas por batalha, em memória (/dev/shm) quando disponível
+WORKSPACE_BASE = "/dev/shm" if os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+WORKSPACE_QUOTA = 8 * 1024 * 1024          # bytes reservados para cada batalha
+WORKSPACE_MAX_BYTES = 256 * 1024 * 1024    # orçamento total de todas as batalhas em andamento
+WORKSPACE_WAIT = 30                        # segundos esperando espaço antes de desistir
+WORKSPACE_ORPHAN_AGE = 24 * 3600           # pastas de processos antigos removidas na inicialização
+BATTLE_CONCURRENCY = max(2, os.cpu_count() or 1)  # batalhas compilando/simulando ao mesmo tempo
+STREAM_CONCURRENCY = 500  # batalhas na tela ao mesmo tempo; a reprodução é só uma corrotina esperando
+
+class WorkspaceBudgetExceeded(Exception):
+    """Não há espaço disponível para mais uma pasta de batalha"""
+
+class WorkspaceManager:
+    """Cria uma pasta temporária por batalha, com limpeza automática e orçamento total de disco"""
+
+    def __init__(self, base=WORKSPACE_BASE, quota=WORKSPACE_QUOTA, max_bytes=WORKSPACE_MAX_BYTES):
+        self.base = base
+        self.quota = quota
+        self.max_bytes = max_bytes
+        self.reserved = 0
+        self.condition = threading.Condition()
+        self._remove_orphans()
+        self.root = tempfile.mkdtemp(prefix="java-air-combat-", dir=base)
+        atexit.register(shutil.rmtree, self.root, True)
+
+    def _remove_orphans(self):
+        """Remove pastas deixadas por execuções anteriores que terminaram sem limpeza"""
+        limite = time.time() - WORKSPACE_ORPHAN_AGE
+        for pasta in glob.glob(os.path.join(self.base, "java-air-combat-*")):
+            try:
+                if os.path.getmtime(pasta) < limite:
+                    shutil.rmtree(pasta, ignore_errors=True)
+            except OSError:
+                pass
+
+    def create(self, timeout=WORKSPACE_WAIT):
+        """Reserva espaço no orçamento e cria a pasta da batalha"""
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.reserved + self.quota <= self.max_bytes, timeout):
+                raise WorkspaceBudgetExceeded("Muitas batalhas em andamento, tente novamente em instantes")
+            self.reserved += self.quota
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            return tempfile.mkdtemp(prefix="battle-", dir=self.root)
+        except OSError:
+            self._release_quota()
+            raise
+
+    def release(self, workspace):
+        """Apaga a pasta da batalha e devolve o espaço reservado"""
+        shutil.rmtree(workspace, ignore_errors=True)
+        self._release_quota()
+
+    def _release_quota(self):
+        with self.condition:
+            self.reserved -= self.quota
+            self.condition.notify()
+
+    @contextlib.contextmanager
+    def workspace(self, timeout=WORKSPACE_WAIT):
+        workspace = self.create(timeout)
+        try:
+            yield workspace
+        finally:
+            self.release(workspace)
+
+    def check_quota(self, workspace):
+        """Garante que a batalha não ultrapassou o espaço reservado"""
+        usado = sum(os.path.getsize(os.path.join(raiz, nome))
+                    for raiz, _, nomes in os.walk(workspace) for nome in nomes)
+        if usado > self.quota:
+            raise WorkspaceBudgetExceeded(f"A batalha ocupou {usado} bytes (limite: {self.quota})")
+
+workspaces = WorkspaceManager()
+
+# Limites de uma batalha: turnos (empate), turnos seguidos sem dano (impasse) e tempo real
+MAX_BATTLE_TURNS = 2000
+STALEMATE_TURNS = 200
+KEYFRAME_INTERVAL = 20  # turnos entre quadros-chave com todos os projéteis no registro do motor
+TURN_CPU_BUDGET_MS = 50       # CPU do código de um time por turno; acima disso perde as ações restantes
+BATTLE_CPU_BUDGET_MS = 5000   # CPU do código de um time na batalha; acima disso é desclassificado
+BATTLE_TIMEOUT = 30  # segundos até matar o JVM (ex.: laço infinito no código de um time)
+BATTLE_OUTPUT_MAX_CHARS = 8 * 1024 * 1024  # saída (stdout) guardada por batalha; acima disso ela é interrompida
+BATTLE_STDERR_MAX_BYTES = 64 * 1024        # stderr guardado por batalha (mesmo limite do BattleWorker)
+
+def battle_args(screen_width, battlefield_height, p1_start_pos, p2_start_pos, team1_health, team2_health,
+                max_turns=MAX_BATTLE_TURNS, stalemate_turns=STALEMATE_TURNS,
+                turn_cpu_ms=TURN_CPU_BUDGET_MS, battle_cpu_ms=BATTLE_CPU_BUDGET_MS,
+                keyframe_interval=KEYFRAME_INTERVAL, output_format="events", seed=None):
+    """Parâmetros da arena no formato nome=valor lido pelo BattleMain (sem `seed`, o motor sorteia uma)"""
+    return [
+        f"width={int(screen_width)}",
+        f"height={int(battlefield_height)}",
+        f"p1={int(p1_start_pos)}",
+        f"p2={int(p2_start_pos)}",
+        f"health1={int(team1_health)}",
+        f"health2={int(team2_health)}",
+        f"turns={int(max_turns)}",
+        f"stalemate={int(stalemate_turns)}",
+        f"turnCpu={int(turn_cpu_ms)}",
+        f"battleCpu={int(battle_cpu_ms)}",
+        f"keyframe={int(keyframe_interval)}",
+        f"format={output_format}",
+        *([f"seed={int(seed)}"] if seed is not None else []),
+    ]
+
+BATTLE_SEED_LIMIT = 2 ** 31  # sementes de 0 a 2^31 - 1, fáceis de digitar de volta
+
+def battle_seed(seed=None):
+    """Semente informada pelo usuário ou uma nova, sorteada; ValueError se estiver fora do intervalo"""
+    if seed is None or seed == "":
+        return secrets.randbelow(BATTLE_SEED_LIMIT)
+    if float(seed) != int(float(seed)) or not 0 <= int(float(seed)) < BATTLE_SEED_LIMIT:
+        raise ValueError(f"A semente deve ser um número inteiro de 0 a {BATTLE_SEED_LIMIT - 1}")
+    return int(float(seed))
+
+# Arquivo AppCDS (Class Data Sharing) com as classes do motor e do JDK que ele usa,
+# reduzindo o tempo de inicialização de cada JVM de batalha
+CDS_TRAINING_ARGS = ["width=50", "height=3", "p1=2", "p2=48", "health1=10", "health2=10"]
+
+def java_runtime_version():
+    """Identificação do JVM; um arquivo CDS só vale para o mesmo build do Java"""
+    try:
+        result = subprocess.run(["java", "-version"], capture_output=True, text=True)
+        return (result.stdout + result.stderr).strip()
+    except OSError:
+        return ""
+
+ENGINE_CDS_ARCHIVE = "{}-{}.jsa".format(
+    ENGINE_JAR[:-len(".jar")],
+    hashlib.sha256(java_runtime_version().encode("utf-8")).hexdigest()[:8] if java_available else "none")
+
+def cds_ready():
+    """O arquivo CDS existe e foi gerado depois do jar atual do motor"""
+    return (os.path.exists(ENGINE_CDS_ARCHIVE) and os.path.exists(ENGINE_JAR)
+            and os.path.getmtime(ENGINE_CDS_ARCHIVE) >= os.path.getmtime(ENGINE_JAR))
+
+def cds_flags():
+    """Opções do JVM para usar o arquivo CDS (e manter avisos do JVM fora do stdout da batalha)"""
+    if not cds_ready():
+        return []
+    return [f"-XX:SharedArchiveFile={ENGINE_CDS_ARCHIVE}", "-Xshare:auto", "-Xlog:disable"]
+
+cds_lock = threading.Lock()
+
+def build_cds_archive():
+    """Gera o arquivo CDS a partir de uma batalha de treino com os templates, se necessário"""
+    with cds_lock:
+        if cds_ready():
+            return True
+        return _dump_cds_archive()
+
+def _dump_cds_archive():
+    """Batalha de treino registrando as classes carregadas e geração do arquivo"""
+
+    inicio = time.perf_counter()
+    with workspaces.workspace() as workspace:
+        ok, erros, _ = compile_with_cache({
+            "Team1Aircraft.java": TEAM1_TEMPLATE,
+            "Team2Aircraft.java": TEAM2_TEMPLATE,
+        }, workspace, ENGINE_JAR)
+        if not ok:
+            print(f"Arquivo CDS não gerado: {erros}")
+            return False
+
+        # Batalha de treino no BattleWorker, registrando todas as classes carregadas
+        lista = os.path.join(workspace, "classes.lst")
+        pedido = "\t".join(["treino", workspace, *CDS_TRAINING_ARGS]) + "\n"
+        try:
+            subprocess.run(["java", f"-XX:DumpLoadedClassList={lista}", "-cp", ENGINE_JAR, "BattleWorker"],
+                           input=pedido, capture_output=True, text=True, timeout=300)
+        except subprocess.TimeoutExpired:
+            print("Arquivo CDS não gerado: a batalha de treino não terminou")
+            return False
+
+        # As classes dos times mudam a cada batalha e vêm de class loaders descartáveis
+        with open(lista) as f:
+            classes = [linha for linha in f
+                       if "source:" not in linha and linha.split(" ")[0] not in ("Team1Aircraft", "Team2Aircraft")]
+        with open(lista, "w") as f:
+            f.writelines(classes)
+
+        temporario = ENGINE_CDS_ARCHIVE + ".tmp"
+        result = subprocess.run(["java", "-Xshare:dump", f"-XX:SharedClassListFile={lista}",
+                                 f"-XX:SharedArchiveFile={temporario}", "-cp", ENGINE_JAR],
+                                capture_output=True, text=True, timeout=300)
+        if result.returncode != 0 or not os.path.exists(temporario):
+            print(f"Arquivo CDS não gerado: {result.stdout[-500:]}{result.stderr[-500:]}")
+            return False
+        os.replace(temporario, ENGINE_CDS_ARCHIVE)
+
+    # Descartar arquivos de versões anteriores do motor ou do Java
+    for antigo in glob.glob(os.path.join(os.path.dirname(ENGINE_JAR), "air-combat-engine-*.jsa")):
+        if os.path.abspath(antigo) != os.path.abspath(ENGINE_CDS_ARCHIVE):
+            os.remove(antigo)
+    print(f"Arquivo CDS do motor gerado em {time.perf_counter() - inicio:.1f} s ({len(classes)} classes)")
+    return True
+
+def benchmark_startup(rounds=5):
+    """Mede o tempo até a primeira saída de um JVM de batalha avulso, com e sem o arquivo CDS"""
+    if not cds_ready():
+        print("Arquivo CDS indisponível; nada a comparar")
+        return None
+
+    tempos = {"JVM padrão": [], "AppCDS do motor": []}
+    with workspaces.workspace() as workspace:
+        ok, erros, _ = compile_with_cache({
+            "Team1Aircraft.java": TEAM1_TEMPLATE,
+            "Team2Aircraft.java": TEAM2_TEMPLATE,
+        }, workspace, ENGINE_JAR)
+        if not ok:
+            raise RuntimeError(erros)
+        for _ in range(rounds):
+            for modo, flags in (("JVM padrão", []), ("AppCDS do motor", cds_flags())):
+                inicio = time.perf_counter()
+                process = subprocess.Popen(
+                    ["java", *flags, "-cp", ENGINE_JAR, "BattleMain", f"classes={workspace}",
+                     *CDS_TRAINING_ARGS],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL
+                )
+                process.stdout.readline()
+                tempos[modo].append(time.perf_counter() - inicio)
+                process.kill()
+                process.wait()
+
+    medianas = {modo: statistics.median(valores) for modo, valores in tempos.items()}
+    economia = 1 - medianas["AppCDS do motor"] / medianas["JVM padrão"]
+    print(f"⏱️ Inicialização do JVM de batalha até a primeira saída ({rounds} rodadas, mediana):")
+    for modo, valor in medianas.items():
+        print(f"  {modo:<18} {valor * 1000:8.0f} ms")
+    print(f"  economia           {economia * 100:8.0f} %")
+    return medianas
+
+# Pool de JVMs de batalha aquecidos (BattleWorker), dimensionado pelo número de CPUs
+WORKER_POOL_SIZE = os.cpu_count() or 1
+WORKER_MAX_BATTLES = 50        # batalhas por JVM antes de reciclá-lo, limitando o metaspace
+WORKER_ACQUIRE_TIMEOUT = 10    # segundos esperando um JVM livre antes de iniciar um JVM avulso
+WORKER_TAINTED_STATUS = 2      # o código dos times deixou threads ou ganchos de desligamento no JVM
+
+def java_major_version(version_text):
+    """Versão principal do Java na saída de "java -version" ("1.8.0_392" -> 8, "17.0.9" -> 17)"""
+    match = re.search(r'version "(\d+)(?:\.(\d+))?', version_text)
+    if not match:
+        return 0
+    major = int(match.group(1))
+    return int(match.group(2) or 0) if major == 1 else major
+
+# O BattleWorker lê os ganchos de desligamento registrados por reflexão; a partir do Java 9 isso exige abrir java.lang
+WORKER_JVM_FLAGS = (["--add-opens=java.base/java.lang=ALL-UNNAMED"]
+                    if java_available and java_major_version(java_runtime_version()) >= 9 else [])
+
+async def read_pipe(fd):
+    """Espera o pipe `fd` ter dados sem bloquear o loop de eventos e devolve o que já chegou (b"" no fim)"""
+    loop = asyncio.get_running_loop()
+    pronto = loop.create_future()
+    loop.add_reader(fd, lambda: pronto.done() or pronto.set_result(None))
+    try:
+        await pronto
+    finally:
+        loop.remove_reader(fd)
+    # O pipe tem dados, então a leitura retorna na hora mesmo com o descritor em modo bloqueante
+    return os.read(fd, 65536)
+
+class BattleWorker:
+    """Um JVM de longa duração que executa uma batalha por vez"""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ["java", *cds_flags(), *WORKER_JVM_FLAGS, "-cp", ENGINE_JAR, "BattleWorker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        self.battles = 0
+        self.busy = False      # continua True se a batalha não foi lida até o fim
+        self.status = None
+        self.stderr = ""
+        self.stderr_omitted = 0  # bytes do stderr descartados pelo BattleWorker além de BATTLE_STDERR_MAX_BYTES
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def _start_battle(self, workspace, args):
+        """Envia a batalha ao JVM e devolve o marcador que encerra a saída dela"""
+        batalha_id = secrets.token_hex(8)
+        self.battles += 1
+        self.busy = True
+        self.status, self.stderr, self.stderr_omitted = None, "", 0
+        self.process.stdin.write(("\t".join([batalha_id, workspace, *args]) + "\n").encode("utf-8"))
+        self.process.stdin.flush()
+        return f"{batalha_id} FIM ".encode("ascii")
+
+    def run(self, workspace, args):
+        """Executa uma batalha com as classes de `workspace` e gera as linhas da saída"""
+        fim = self._start_battle(workspace, args)
+        for raw in iter(self.process.stdout.readline, b""):
+            posicao = raw.find(fim)
+            if posicao < 0:
+                yield raw.decode("utf-8", "replace")
+                continue
+            if posicao > 0:
+                yield raw[:posicao].decode("utf-8", "replace")
+            _, _, status, tamanho, omitidos = raw[posicao:].decode("ascii").split()
+            self.stderr = self.process.stdout.read(int(tamanho)).decode("utf-8", "replace")
+            self.stderr_omitted = int(omitidos)
+            self.status = int(status)
+            self.busy = False
+            return
+        self.status = -1  # O JVM terminou no meio da batalha (ex.: System.exit no código do time)
+
+    async def run_async(self, workspace, args):
+        """Como run, mas espera a saída do JVM no loop de eventos em vez de bloquear uma thread"""
+        fim = self._start_battle(workspace, args)
+        fd = self.process.stdout.fileno()
+        pendente = b""
+        while True:
+            posicao = pendente.find(fim)
+            if posicao < 0:
+                # Entregar as linhas completas assim que chegam
+                corte = pendente.rfind(b"\n") + 1
+                for raw in pendente[:corte].splitlines(keepends=True):
+                    yield raw.decode("utf-8", "replace")
+                pendente = pendente[corte:]
+            else:
+                cabecalho = pendente.find(b"\n", posicao)
+                if cabecalho >= 0:
+                    _, _, status, tamanho, omitidos = pendente[posicao:cabecalho].decode("ascii").split()
+                    if len(pendente) - cabecalho - 1 >= int(tamanho):
+                        break
+            bloco = await read_pipe(fd)
+            if not bloco:
+                self.status = -1
+                return
+            pendente += bloco
+
+        for raw in pendente[:posicao].splitlines(keepends=True):
+            yield raw.decode("utf-8", "replace")
+        self.stderr = pendente[cabecalho + 1:cabecalho + 1 + int(tamanho)].decode("utf-8", "replace")
+        self.stderr_omitted = int(omitidos)
+        self.status = int(status)
+        self.busy = False
+
+    def close(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+
+class BattleWorkerPool:
+    """Empresta JVMs de batalha aquecidos, criando até `size` e reciclando os desgastados"""
+
+    def __init__(self, size=WORKER_POOL_SIZE):
+        self.size = size
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def _spawn(self):
+        with self.lock:
+            if self.count >= self.size:
+                return None
+            self.count += 1
+        try:
+            return BattleWorker()
+        except OSError:
+            with self.lock:
+                self.count -= 1
+            raise
+
+    def warm_up(self):
+        """Inicia todos os JVMs do pool antes da primeira batalha"""
+        try:
+            while True:
+                worker = self._spawn()
+                if worker is None:
+                    break
+                self.idle.put(worker)
+            print(f"Pool de batalha pronto com {self.size} JVMs")
+        except OSError as e:
+            print(f"Pool de batalha indisponível: {e}")
+
+    def acquire(self, timeout=WORKER_ACQUIRE_TIMEOUT):
+        """Retorna um JVM livre; levanta queue.Empty se nenhum ficar livre a tempo"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                worker = self._spawn()
+                if worker is None:
+                    worker = self.idle.get(timeout=max(0, deadline - time.monotonic()))
+            if worker.alive():
+                return worker
+            self._discard(worker)
+
+    async def acquire_async(self, timeout=WORKER_ACQUIRE_TIMEOUT):
+        """Como acquire, sem bloquear o loop de eventos; um JVM obtido depois do cancelamento volta ao pool"""
+        espera = asyncio.get_running_loop().run_in_executor(None, self.acquire, timeout)
+        try:
+            return await asyncio.shield(espera)
+        except asyncio.CancelledError:
+            espera.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, espera):
+        if not espera.cancelled() and espera.exception() is None:
+            self.release(espera.result())
+
+    def release(self, worker):
+        if worker.status == WORKER_TAINTED_STATUS:
+            print("JVM de batalha descartado: o código dos times deixou threads ou ganchos de desligamento")
+        if (worker.busy or not worker.alive() or worker.battles >= WORKER_MAX_BATTLES
+                or worker.status == WORKER_TAINTED_STATUS):
+            self._discard(worker)
+        else:
+            self.idle.put(worker)
+
+    def _discard(self, worker):
+        worker.close()
+        with self.lock:
+            self.count -= 1
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+battle_pool = BattleWorkerPool()
+atexit.register(battle_pool.close)
+def prepare_battle_jvms():
+    """Gera o arquivo CDS (reportando o ganho quando ele é novo) e depois aquece o pool"""
+    novo = not cds_ready()
+    if build_cds_archive() and novo:
+        benchmark_startup()
+    battle_pool.warm_up()
+
+if engine_ready and not BUILD_ENGINE_ONLY:
+    threading.Thread(target=prepare_battle_jvms, daemon=True).start()
+
+class BattleDeadline:
+    """Mata o JVM de uma batalha que passar de `timeout` segundos"""
+
+    def __init__(self, process, timeout, loop=None):
+        self.expired = False
+        if loop is None:
+            self.timer = threading.Timer(timeout, self._expire, args=(process,))
+            self.timer.daemon = True
+            self.timer.start()
+        else:
+            # No loop de eventos o prazo é só um callback agendado, sem thread extra
+            self.timer = loop.call_later(timeout, self._expire, process)
+
+    def _expire(self, process):
+        self.expired = True
+        process.kill()
+
+    def cancel(self):
+        self.timer.cancel()
+
+class BoundedCapture:
+    """Guarda os primeiros `limit` bytes de um stream e lê e descarta o restante, para o pipe nunca encher"""
+
+    def __init__(self, limit=BATTLE_STDERR_MAX_BYTES):
+        self.limit = limit
+        self.chunks = []
+        self.size = 0
+        self.omitted = 0
+
+    def write(self, data):
+        guardar = max(0, min(len(data), self.limit - self.size))
+        if guardar:
+            self.chunks.append(data[:guardar])
+            self.size += guardar
+        self.omitted += len(data) - guardar
+
+    def drain(self, fd):
+        """Lê o descritor até o fim (alvo de uma thread)"""
+        for bloco in iter(lambda: os.read(fd, 65536), b""):
+            self.write(bloco)
+
+    async def drain_async(self, reader):
+        """Lê um StreamReader do asyncio até o fim"""
+        while True:
+            bloco = await reader.read(65536)
+            if not bloco:
+                return
+            self.write(bloco)
+
+    def text(self):
+        return b"".join(self.chunks).decode("utf-8", "replace")
+
+class BattleOutputLimit:
+    """Conta a saída (stdout) de uma batalha, que é interrompida ao passar de `limit` caracteres"""
+
+    def __init__(self, limit=BATTLE_OUTPUT_MAX_CHARS):
+        self.limit = limit
+        self.size = 0
+        self.exceeded = False
+
+    def add(self, linha):
+        self.size += len(linha)
+        self.exceeded = self.size > self.limit
+        return not self.exceeded
+
+BATTLE_END_PREFIX = '{"t":"end"'  # início do registro de fim escrito pelo motor
+
+def aborted_battle_record(reason):
+    """Registro de fim (empate) para uma batalha interrompida pelo servidor"""
+    return json.dumps({"t": "end", "winner": 0, "reason": reason, "turns": None, "cpu": None,
+                       "aborted": True}) + "\n"
+
+def battle_epilogue(prazo, timeout, saida, stderr, omitidos, terminou):
+    """Registros que o servidor acrescenta à saída do motor: fim forçado e o stderr da batalha
+
+    `terminou` diz se o motor escreveu o registro de fim; sem ele (ex.: System.exit no código de um time,
+    JVM morto por falta de memória) a batalha também recebe um fim, para a interface sempre ter o que mostrar."""
+    registros = []
+    if prazo.expired:
+        registros.append(aborted_battle_record(f"tempo limite de {timeout} s excedido"))
+    elif saida.exceeded:
+        registros.append(aborted_battle_record(f"saída da batalha passou de {saida.limit // 1024 // 1024} MB"))
+    elif not terminou:
+        registros.append(aborted_battle_record(
+            "o motor parou antes do fim da batalha (veja a saída de erro)" if stderr or omitidos
+            else "o motor parou inesperadamente (ex.: System.exit no código de um time)"))
+    if stderr or omitidos:
+        print(f"⚠️ stderr da batalha: {len(stderr)} caracteres guardados, {omitidos} bytes descartados; "
+              f"início: {stderr[:200]!r}")
+        registros.append(json.dumps({"t": "stderr", "text": stderr, "omitted": omitidos}) + "\n")
+    return registros
+
+def simulate_battle(workspace, args, timeout=BATTLE_TIMEOUT):
+    """Gera a saída da batalha em um JVM aquecido do pool, ou em um JVM avulso se o pool não puder atender"""
+    try:
+        worker = battle_pool.acquire()
+    except (queue.Empty, OSError):
+        worker = None
+
+    saida = BattleOutputLimit()
+    terminou = False  # o motor escreveu o registro de fim
+    if worker is not None:
+        # Um JVM do pool morto pelo prazo ou interrompido no meio é descartado no release (batalha incompleta)
+        prazo = BattleDeadline(worker.process, timeout)
+        try:
+            for linha in worker.run(workspace, args):
+                if not saida.add(linha):
+                    break
+                terminou = terminou or linha.startswith(BATTLE_END_PREFIX)
+                yield linha
+        finally:
+            prazo.cancel()
+            stderr, omitidos = worker.stderr, worker.stderr_omitted
+            battle_pool.release(worker)
+    else:
         process = subprocess.Popen(
-            ["java", "-cp", "combat_classes", "BattleMain"],
+            ["java", *cds_flags(), "-cp", ENGINE_JAR, "BattleMain", f"classes={workspace}", *args],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
             bufsize=1
         )
+        prazo = BattleDeadline(process, timeout)
+        # O stderr é lido em paralelo: um time que escreve muito nele não trava o JVM com o pipe cheio
+        erros = BoundedCapture()
+        leitor = threading.Thread(target=erros.drain, args=(process.stderr.fileno(),), daemon=True)
+        leitor.start()
+        try:
+            for linha in iter(process.stdout.readline, ""):
+                if not saida.add(linha):
+                    break
+                terminou = terminou or linha.startswith(BATTLE_END_PREFIX)
+                yield linha
+        finally:
+            # Encerrar o JVM (ex.: usuário saiu da página) antes de apagar a pasta da batalha
+            prazo.cancel()
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            leitor.join(1)
+            stderr, omitidos = erros.text(), erros.omitted
+
+    yield from battle_epilogue(prazo, timeout, saida, stderr, omitidos, terminou)
+
+async def simulate_battle_async(workspace, args, timeout=BATTLE_TIMEOUT):
+    """Como simulate_battle, mas lê o JVM pelo loop de eventos: nenhuma thread fica presa durante a batalha"""
+    loop = asyncio.get_running_loop()
+    try:
+        worker = await battle_pool.acquire_async()
+    except (queue.Empty, OSError):
+        worker = None
+
+    saida = BattleOutputLimit()
+    terminou = False  # o motor escreveu o registro de fim
+    if worker is not None:
+        prazo = BattleDeadline(worker.process, timeout, loop)
+        try:
+            async for linha in worker.run_async(workspace, args):
+                if not saida.add(linha):
+                    break
+                terminou = terminou or linha.startswith(BATTLE_END_PREFIX)
+                yield linha
+        finally:
+            prazo.cancel()
+            stderr, omitidos = worker.stderr, worker.stderr_omitted
+            battle_pool.release(worker)
+    else:
+        process = await asyncio.create_subprocess_exec(
+            "java", *cds_flags(), "-cp", ENGINE_JAR, "BattleMain", f"classes={workspace}", *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=1024 * 1024  # linhas longas (ex.: prints dos times) sem erro de limite do StreamReader
+        )
+        prazo = BattleDeadline(process, timeout, loop)
+        # O stderr é lido em paralelo, como em simulate_battle
+        erros = BoundedCapture()
+        leitor = loop.create_task(erros.drain_async(process.stderr))
+        try:
+            async for raw in process.stdout:
+                linha = raw.decode("utf-8", "replace")
+                if not saida.add(linha):
+                    break
+                terminou = terminou or linha.startswith(BATTLE_END_PREFIX)
+                yield linha
+        finally:
+            prazo.cancel()
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+            await leitor
+            stderr, omitidos = erros.text(), erros.omitted
+
+    for registro in battle_epilogue(prazo, timeout, saida, stderr, omitidos, terminou):
+        yield registro
+
+# Protocolo de eventos do BattleMain: um registro JSON por linha (ver BattleLog no motor)
+BATTLE_PROTOCOL_VERSION = 2
+BATTLE_EVENT_MESSAGES = {
+    "nuke": "!!! Time {team} lançou um MISSIL NUCLEAR!",
+    "double": "{arrow} Time {team} disparou um TIRO DUPLO!",
+    "nukehit": "!!! MISSIL NUCLEAR do Time {enemy} atingiu o Time {team}!",
+    "hit": "*** Aeronave do Time {team} atingida! -{value} pontos",
+    "dodge": "--- Aeronave do Time {team} esquivou!",
+    "radar": "... Radar do Time {team} detectou o projétil!",
+    "slow": "... Time {team} excedeu o tempo de CPU do turno; ações restantes ignoradas",
+}
 
-        # Usar deque para manter os últimos turnos na visualização
-        turnos = deque(maxlen=4)  # Últimos 4 turnos para visualização fluida
-
-        # Guardar saída completa
-        saida_completa = ""
-        turno_atual = ""
-        coletando_turno = False
-        resultado_final = None
-
-        for line in iter(process.stdout.readline, ""):
-            saida_completa += line
-
-            # Detectar novo turno
-            if "=== NOVO TURNO ===" in line:
-                if turno_atual:
-                    turnos.append(turno_atual)
-                turno_atual = line
-                coletando_turno = True
-            elif coletando_turno:
-                turno_atual += line
-
-            # Verificar se é o resultado final
-            if "venceu" in line:
-                resultado_final = line
-
-            # Atualizar a cada turno
-            texto = "".join(list(turnos)) + turno_atual
-
-            # Conversão de cores usando função robusta
-            formatted_texto = format_colors(texto)
-
-            # Script de scroll
-            scroll_js = """
-            <script>
-            (function() {
-                function forceScrollBottom() {
-                    const container = document.getElementById('battle-container');
-                    if (container) {
-                        container.scrollTop = container.scrollHeight * 10;
-                        setTimeout(() => {
-                            container.scrollTop = container.scrollHeight * 10;
-                        }, 50);
-                    }
-                }
-                forceScrollBottom();
-                const scrollInterval = setInterval(forceScrollBottom, 100);
-                setTimeout(() => { clearInterval(scrollInterval); }, 2000);
-            })();
-            </script>
-            """
+def describe_event(kind, team, value):
+    """Mensagem de um evento do turno, igual à do modo texto do motor"""
+    return BATTLE_EVENT_MESSAGES[kind].format(team=team, enemy=3 - team, value=value,
+                                              arrow=">>>" if team == 1 else "<<<")
+
+class BattleFrameDecoder:
+    """Reconstrói os projéteis visíveis de cada turno a partir dos quadros-chave e deltas do motor"""
+
+    def __init__(self):
+        self.projectiles = {}  # id -> [x, y, vx, símbolo]
+
+    def decode(self, record):
+        if record.get("k"):
+            self.projectiles = {}
+        else:
+            # Projéteis conhecidos seguem em linha reta; o delta só corrige quem fugiu da previsão
+            for projetil in self.projectiles.values():
+                projetil[0] += projetil[2]
+            for projetil_id in record["x"]:
+                self.projectiles.pop(projetil_id, None)
+        for projetil_id, x, y, vx, simbolo in record["p"]:
+            self.projectiles[projetil_id] = [x, y, vx, simbolo]
+        return [(x, y, simbolo) for x, y, _, simbolo in self.projectiles.values()]
+
+def render_turn(arena, record, projectiles, team_output=()):
+    """Texto de um turno a partir do registro do motor, no formato do campo de batalha em ASCII"""
+    campo = [[" "] * arena["w"] for _ in range(arena["h"])]
+    for simbolo, (x, y) in zip(arena["s"], record["a"]):
+        campo[y][x] = simbolo
+    for x, y, simbolo in projectiles:
+        campo[y][x] = simbolo
+
+    (x1, y1), (x2, y2) = record["a"]
+    vida1, vida2 = record["hp"]
+    return "".join([
+        "\n=== NOVO TURNO ===\n",
+        *team_output,
+        *(describe_event(*evento) + "\n" for evento in record["e"]),
+        *("".join(linha) + "\n" for linha in campo),
+        f"Vida Time 1: {vida1} | Vida Time 2: {vida2}\n",
+        f"Posições - Time 1: ({x1},{y1}) | Time 2: ({x2},{y2})\n",
+    ])
+
+def battle_frame(record, projectiles, team_output=()):
+    """Quadro compacto de um turno para o renderizador do navegador: o estado visível, sem o campo desenhado
+
+    O tamanho depende só do número de projéteis e de mensagens, não da área da arena."""
+    return {
+        "n": record["n"],
+        "a": record["a"],
+        "hp": record["hp"],
+        "p": projectiles,
+        "l": [*(format_colors(linha).rstrip("\n") for linha in team_output),
+              *(describe_event(*evento) for evento in record["e"])],
+    }
 
-            html_output = f"""
-            <div id="battle-container" style="height:400px; overflow:auto; border:1px solid #ccc; padding:10px;
-                                             font-family:monospace; white-space:pre; background-color:#f8f8f8;">
-                {formatted_texto}
-            </div>
-            {scroll_js}
+def render_result(record):
+    """Texto do fim da batalha: semente, tempo de CPU de cada time e o resultado"""
+    linhas = []
+    if record.get("seed") is not None:
+        linhas.append(f"Semente: {record['seed']}\n")
+    for time_id, cpu in enumerate(record["cpu"] or (), 1):
+        metodos = "".join(f" | {nome} {ms:.1f} ms ({chamadas})" for nome, (ms, chamadas) in cpu["methods"].items())
+        linhas.append(f"Tempo de CPU Time {time_id}: {cpu['ms']:.1f} ms{metodos}\n")
+    for time_id, estatisticas in enumerate(record.get("stats") or (), 1):
+        por_tipo = ", ".join(f"{nome} {quantidade}" for nome, quantidade in estatisticas["shots"].items())
+        linhas.append(f"Estatísticas Time {time_id}: tiros {sum(estatisticas['shots'].values())}"
+                      f"{f' ({por_tipo})' if por_tipo else ''} | acertos {estatisticas['hits']}"
+                      f" | esquivas {estatisticas['dodges']} | dano causado {estatisticas['damage']}\n")
+    if record["winner"] == 0:
+        linhas.append(f"*** Empate! {record['reason']} ***\n")
+    else:
+        if record["reason"]:
+            linhas.append(f"!!! {record['reason']}\n")
+        linhas.append(f"*** Time {record['winner']} venceu! ***\n")
+    return "".join(linhas)
+
+def battle_grid_html(arena):
+    """HTML do campo vazio que o renderizador do navegador (BATTLE_RENDERER_JS) preenche a cada turno"""
+    simbolos = html.escape(json.dumps(arena["s"], ensure_ascii=False))
+    return f"""
+        <div id="battle-grid" data-w="{arena['w']}" data-h="{arena['h']}" data-s="{simbolos}">
+            <div class="ac-log" style="height:250px; overflow:auto; border:1px solid #ccc; padding:10px;
+                                       font-family:monospace; white-space:pre; background-color:#f8f8f8;"></div>
+            <div class="ac-campo" style="overflow:auto; border:1px solid #ccc; border-top:none; padding:10px;
+                                         font-family:monospace; white-space:pre; background-color:#f8f8f8;"></div>
+            <div class="ac-status" style="padding:5px 10px; font-family:monospace; white-space:pre;"></div>
+        </div>
+        """
+
+# Replays: a saída de cada batalha fica em disco e pode ser assistida de novo sem compilar nem rodar o JVM
+REPLAY_DIR = "replays"
+REPLAY_MAX_BYTES = 256 * 1024 * 1024
+REPLAY_FORMAT_VERSION = 1
+REPLAY_SEGMENT_TURNS = 100  # turnos por trecho comprimido do arquivo (cada trecho começa num quadro-chave)
+REPLAY_ID_RE = re.compile(r'^[0-9a-f]{16}$')
+# Sorteios e relógios fora da semente da batalha: código que os usa não repete a batalha
+UNSEEDED_SOURCE_RE = re.compile(r'\bnew\s+(?:java\s*\.\s*util\s*\.\s*)?Random\b|\bMath\s*\.\s*random\b'
+                                r'|\bThreadLocalRandom\b|\bnanoTime\b|\bcurrentTimeMillis\b')
+
+def unseeded_source(code):
+    """Trecho do código (sem comentários) que sorteia ou lê o relógio fora da semente da batalha, ou None"""
+    encontrado = UNSEEDED_SOURCE_RE.search(normalize_java_source(code))
+    return encontrado.group(0) if encontrado else None
+
+class ReplayStore:
+    """Replays em arquivos zip (um trecho comprimido por grupo de turnos), com LRU limitado em bytes
+
+    O arquivo tem o início da batalha (head.jsonl), os turnos em trechos que começam sempre num
+    quadro-chave (seg-NNNNN.jsonl), o fim (tail.jsonl) e o índice meta.json com o primeiro turno de cada
+    trecho, então assistir a partir de um turno descomprime só os trechos dali em diante. O ID é o hash
+    da saída do motor: a mesma batalha gravada duas vezes ocupa um arquivo só.
+
+    Também memoriza resultados: uma batalha que terminou normalmente, sem depender do relógio, fica
+    associada à chave dos seus parâmetros (battle_key), e a mesma batalha pedida de novo é servida do
+    replay sem rodar o JVM.
+    Chaves diferentes podem dar a mesma saída (e o mesmo replay); todas vão no meta.json e saem do
+    índice junto com o replay quando ele é descartado."""
+
+    def __init__(self, replay_dir=REPLAY_DIR, max_bytes=REPLAY_MAX_BYTES):
+        self.replay_dir = replay_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()   # id -> tamanho em bytes, do menos ao mais recente
+        self.total_bytes = 0
+        self.keys = {}                 # chave da batalha -> id
+        self.key_of = {}               # id -> conjunto de chaves das batalhas
+        self.saved = 0
+        self.loaded = 0
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    def _load_index(self):
+        """Reconstrói o índice LRU a partir dos replays de uma execução anterior"""
+        os.makedirs(self.replay_dir, exist_ok=True)
+        arquivos = []
+        for nome in os.listdir(self.replay_dir):
+            if nome.endswith(".zip"):
+                stat = os.stat(os.path.join(self.replay_dir, nome))
+                arquivos.append((stat.st_mtime, nome[:-len(".zip")], stat.st_size))
+        for _, replay_id, tamanho in sorted(arquivos):
+            self.entries[replay_id] = tamanho
+            self.total_bytes += tamanho
+        self._evict()
+        for replay_id in list(self.entries):
+            try:
+                with zipfile.ZipFile(self._path(replay_id)) as z:
+                    chaves = json.loads(z.read("meta.json")).get("keys", [])
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+                self._remove(replay_id)
+                continue
+            for chave in chaves:
+                self._remember(chave, replay_id)
+
+    def _path(self, replay_id):
+        return os.path.join(self.replay_dir, replay_id + ".zip")
+
+    @staticmethod
+    def replay_id(linhas):
+        return hashlib.sha256("".join(linhas).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def battle_key(code1, code2, args):
+        """Chave de uma batalha: motor, compilador, código normalizado dos times e parâmetros (com a semente)"""
+        dados = "\0".join([ENGINE_SOURCE_HASH, class_cache.compiler_id,
+                           normalize_java_source(code1), normalize_java_source(code2), *args])
+        return hashlib.sha256(dados.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, replay_id):
+        anterior = self.keys.get(key)
+        if anterior is not None:
+            self.key_of[anterior].discard(key)
+        self.keys[key] = replay_id
+        self.key_of.setdefault(replay_id, set()).add(key)
+
+    def _add_key(self, replay_id, key):
+        """Memoriza mais uma chave para um replay já gravado, regravando o meta.json do arquivo"""
+        if self.keys.get(key) == replay_id:
+            return
+        temporario = self._path(replay_id) + ".tmp"
+        try:
+            with zipfile.ZipFile(self._path(replay_id)) as origem, \
+                    zipfile.ZipFile(temporario, "w", zipfile.ZIP_DEFLATED) as z:
+                meta = json.loads(origem.read("meta.json"))
+                meta["keys"] = sorted(self.key_of.get(replay_id, set()) | {key})
+                z.writestr("meta.json", json.dumps(meta))
+                for nome in origem.namelist():
+                    if nome != "meta.json":
+                        z.writestr(nome, origem.read(nome))
+            os.replace(temporario, self._path(replay_id))
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            self._remove(replay_id)
+            return
+        self.total_bytes += os.path.getsize(self._path(replay_id)) - self.entries[replay_id]
+        self.entries[replay_id] = os.path.getsize(self._path(replay_id))
+        self._remember(key, replay_id)
+
+    def lookup(self, key):
+        """ID do replay da batalha com esta chave, ou None"""
+        with self.lock:
+            replay_id = self.keys.get(key)
+            if replay_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return replay_id
+
+    @staticmethod
+    def _split(linhas):
+        """Separa a saída do motor em início, trechos de turnos e fim; diz também se a batalha terminou
+        sem depender do relógio (e pode ser memorizada)"""
+        inicio, trechos, fim = [], [], []
+        terminou = False
+        for record, saida_times, linha in battle_records(linhas):
+            if record["t"] == "start":
+                inicio.append(linha)
+            elif record["t"] == "turn":
+                if not trechos or (record.get("k") and trechos[-1]["turns"] >= REPLAY_SEGMENT_TURNS):
+                    trechos.append({"first": record["n"], "turns": 0, "lines": []})
+                trechos[-1]["turns"] += 1
+                if saida_times:
+                    # Prints regravados como registro "out": no replay nada vira registro do protocolo
+                    trechos[-1]["lines"].append(json.dumps({"t": "out", "text": "".join(saida_times)},
+                                                           ensure_ascii=False) + "\n")
+                trechos[-1]["lines"].append(linha)
+            else:
+                fim.append(linha)
+                terminou = terminou or (record["t"] == "end" and not record.get("clock")
+                                        and not record.get("aborted"))
+        return inicio, trechos, fim, terminou
+
+    def save(self, linhas, key=None):
+        """Grava a saída de uma batalha e devolve o ID do replay
+
+        Com `key` (battle_key), a batalha fica memorizada, desde que o motor tenha chegado ao fim dela:
+        batalhas interrompidas (tempo esgotado, saída grande demais) ou decididas pelo orçamento de CPU
+        não são servidas de novo."""
+        replay_id = self.replay_id(linhas)
+        with self.lock:
+            if replay_id in self.entries:
+                self.entries.move_to_end(replay_id)
+                os.utime(self._path(replay_id))
+                if key and self._split(linhas)[3]:
+                    self._add_key(replay_id, key)
+                    self._evict()
+                return replay_id
+            inicio, trechos, fim, terminou = self._split(linhas)
+            meta = {"v": REPLAY_FORMAT_VERSION, "protocol": BATTLE_PROTOCOL_VERSION, "created": int(time.time()),
+                    "keys": [key] if key and terminou else [], "turns": sum(trecho["turns"] for trecho in trechos),
+                    "segments": [[trecho["first"], f"seg-{indice:05d}.jsonl"] for indice, trecho in enumerate(trechos)]}
+            temporario = self._path(replay_id) + ".tmp"
+            with zipfile.ZipFile(temporario, "w", zipfile.ZIP_DEFLATED) as z:
+                z.writestr("meta.json", json.dumps(meta))
+                z.writestr("head.jsonl", "".join(inicio))
+                for (_, nome), trecho in zip(meta["segments"], trechos):
+                    z.writestr(nome, "".join(trecho["lines"]))
+                z.writestr("tail.jsonl", "".join(fim))
+            os.replace(temporario, self._path(replay_id))
+            self.entries[replay_id] = os.path.getsize(self._path(replay_id))
+            self.total_bytes += self.entries[replay_id]
+            for chave in meta["keys"]:
+                self._remember(chave, replay_id)
+            self.saved += 1
+            self._evict()
+        return replay_id
+
+    def load(self, replay_id, first_turn=1):
+        """Linhas da saída do motor a partir do trecho que contém `first_turn`; None se o replay não existe"""
+        replay_id = replay_id.strip().lower()
+        with self.lock:
+            if not REPLAY_ID_RE.match(replay_id) or replay_id not in self.entries:
+                return None
+            try:
+                with zipfile.ZipFile(self._path(replay_id)) as z:
+                    meta = json.loads(z.read("meta.json"))
+                    if meta["protocol"] != BATTLE_PROTOCOL_VERSION:
+                        return None
+                    primeiros = [primeiro for primeiro, _ in meta["segments"]]
+                    trecho = max(0, bisect.bisect_right(primeiros, first_turn) - 1)
+                    nomes = ["head.jsonl", *(nome for _, nome in meta["segments"][trecho:]), "tail.jsonl"]
+                    linhas = [linha for nome in nomes
+                              for linha in z.read(nome).decode("utf-8").splitlines(keepends=True)]
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+                self._remove(replay_id)
+                return None
+            self.entries.move_to_end(replay_id)
+            os.utime(self._path(replay_id))
+            self.loaded += 1
+            return linhas
+
+    def _remove(self, replay_id):
+        self.total_bytes -= self.entries.pop(replay_id, 0)
+        for chave in self.key_of.pop(replay_id, ()):
+            self.keys.pop(chave, None)
+        try:
+            os.remove(self._path(replay_id))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._remove(next(iter(self.entries)))
+
+    def stats(self):
+        with self.lock:
+            return {"saved": self.saved, "loaded": self.loaded, "hits": self.hits, "misses": self.misses,
+                    "entries": len(self.entries), "memoized": len(self.keys), "bytes": self.total_bytes}
+
+replay_store = ReplayStore()
+
+def render_history_page(recording, page):
+    """HTML de uma página do histórico guardado no servidor"""
+    if recording is None:
+        return ""
+    primeiro = page * HISTORY_PAGE_TURNS + 1
+    ultimo = min(primeiro + HISTORY_PAGE_TURNS - 1, len(recording.turns))
+    return f"""
+        <div><b>Turnos {primeiro}–{ultimo} de {len(recording.turns)}</b> (página {page + 1} de {recording.pages})</div>
+        <div id="historico-completo" style="height:500px; overflow:auto; border:1px solid #ccc; padding:10px;
+                   font-family:monospace; white-space:pre; background-color:#f8f8f8;">{html.escape(recording.page(page))}</div>
+        """
+
+def render_stderr(record):
+    """Bloco HTML recolhido com o stderr da batalha (ex.: exceções no código dos times)"""
+    omitidos = f"\n... {record['omitted']} bytes omitidos ..." if record["omitted"] else ""
+    return f"""
+            <details style="margin-top:10px;">
+                <summary>⚠️ Saída de erro (System.err) da batalha</summary>
+                <div style="max-height:300px; overflow:auto; border:1px solid #f0c36d; padding:10px;
+                            font-family:monospace; white-space:pre; background-color:#fff8e6;">{html.escape(record['text'] + omitidos)}</div>
+            </details>
             """
 
-            yield html_output
-            time.sleep(0.05)
+def battle_records(lines):
+    """Gera (registro, prints dos times, linha) para cada registro do protocolo na saída do motor
+
+    Os prints dos times (registros "out" e linhas fora do protocolo) vão junto do turno seguinte. Depois
+    do primeiro "end" só o registro "stderr" (escrito pelo servidor, não pelo motor) é aceito: o que um
+    time ainda conseguir escrever na saída não muda o resultado."""
+    saida_times = []
+    terminou = False
+    for line in lines:
+        record = None
+        if line.startswith("{"):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                pass
+        if terminou:
+            if isinstance(record, dict) and record.get("t") == "stderr":
+                yield record, (), line
+            continue
+        if not isinstance(record, dict) or "t" not in record:
+            saida_times.append(line)
+            continue
+        if record["t"] == "out":
+            saida_times.extend(str(record.get("text", "")).splitlines(keepends=True))
+            continue
+        terminou = record["t"] == "end"
+
+        if record["t"] == "start" and record.get("v") != BATTLE_PROTOCOL_VERSION:
+            raise RuntimeError(f"Versão do protocolo do motor não suportada: {record.get('v')}")
+        if record["t"] == "turn":
+            yield record, saida_times, line
+            saida_times = []
+        else:
+            yield record, (), line
+
+def parse_battle_stream(lines, frames=False, text=True):
+    """Converte a saída do motor em ("turn", texto), ("end", registro) e ("stderr", registro)
+
+    Com `frames`, também gera ("start", registro) e, antes do texto de cada turno, ("frame", battle_frame).
+    Sem `text`, o texto dos turnos não é desenhado."""
+    arena = None
+    decoder = BattleFrameDecoder()
+    for record, saida_times, _ in battle_records(lines):
+        if record["t"] == "start":
+            arena = record
+            if frames:
+                yield "start", record
+        elif record["t"] == "turn":
+            if not (frames or text):
+                continue
+            projeteis = decoder.decode(record)
+            if frames:
+                yield "frame", battle_frame(record, projeteis, saida_times)
+            if text:
+                yield "turn", render_turn(arena, record, projeteis, saida_times)
+        elif record["t"] in ("end", "stderr"):
+            yield record["t"], record
+
+def battle_result(lines):
+    """Registro final de uma batalha já terminada (None se o motor parou antes do fim)"""
+    for tipo, conteudo in parse_battle_stream(lines, text=False):
+        if tipo == "end":
+            return conteudo
+    return None
+
+def run_headless_battles(code1, code2, count, screen_width=100, battlefield_height=3, p1_start_pos=2,
+                         p2_start_pos=None, team1_health=100, team2_health=100, seed=None):
+    """Roda `count` batalhas sem exibição (formato "stats" do motor) e retorna os registros finais
+
+    Com `seed`, a batalha i usa a semente seed + i e o conjunto de resultados se repete a cada execução."""
+    if p2_start_pos is None:
+        p2_start_pos = screen_width - 2
+
+    def args(i):
+        return battle_args(screen_width, battlefield_height, p1_start_pos, p2_start_pos, team1_health, team2_health,
+                           output_format="stats", seed=None if seed is None else seed + i)
+
+    with workspaces.workspace() as workspace:
+        ok, erros, _ = compile_with_cache({
+            "Team1Aircraft.java": code1,
+            "Team2Aircraft.java": code2,
+        }, workspace, ENGINE_JAR)
+        if not ok:
+            raise RuntimeError(erros)
+        # Uma batalha por JVM do pool ao mesmo tempo, todas com as mesmas classes compiladas
+        with concurrent.futures.ThreadPoolExecutor(WORKER_POOL_SIZE) as executor:
+            return list(executor.map(lambda i: battle_result(list(simulate_battle(workspace, args(i)))), range(count)))
+
+def benchmark_headless(count=1000):
+    """Mede quantas batalhas sem exibição (templates contra templates) o servidor roda por minuto"""
+    run_headless_battles(TEAM1_TEMPLATE, TEAM2_TEMPLATE, WORKER_POOL_SIZE)  # aquece o pool e o JIT
+    inicio = time.perf_counter()
+    # Sementes fixas: o placar se repete de uma execução para outra, só o tempo varia
+    resultados = run_headless_battles(TEAM1_TEMPLATE, TEAM2_TEMPLATE, count, seed=0)
+    duracao = time.perf_counter() - inicio
+
+    terminadas = [r for r in resultados if r is not None]
+    vitorias = [sum(r["winner"] == vencedor for r in terminadas) for vencedor in (1, 2, 0)]
+    print(f"⏱️ {count} batalhas sem exibição em {duracao:.1f} s ({count / duracao * 60:.0f} por minuto)")
+    print(f"  Time 1 {vitorias[0]} | Time 2 {vitorias[1]} | empates {vitorias[2]} | "
+          f"falhas {count - len(terminadas)}")
+    if terminadas:
+        print(f"  turnos por batalha (mediana): {statistics.median(r['turns'] for r in terminadas):.0f}")
+    return resultados
+
+def benchmark_compilation(rounds=3):
+    """Compara a latência de compilação: um javac por arquivo, uma única chamada e o servidor aquecido"""
+    fontes = {
+        "Aircraft.java": aircraft_code,
+        "Projectile.java": projectile_code,
+        "Team1Aircraft.java": TEAM1_TEMPLATE,
+        "Team2Aircraft.java": TEAM2_TEMPLATE,
+        "BattleMain.java": battle_main_code,
+    }
+    tempos = {"um javac por arquivo": [], "javac único": []}
+    try:
+        # A primeira chamada inicia e aquece o servidor; não entra na medição
+        compile_daemon.compile(fontes)
+        tempos["servidor aquecido"] = []
+    except CompileDaemonUnavailable as e:
+        print(f"Servidor de compilação fora da medição: {e}")
+
+    for _ in range(rounds):
+        for modo in tempos:
+            pasta = tempfile.mkdtemp(prefix="bench_compile_")
+            try:
+                arquivos = []
+                for nome, codigo in fontes.items():
+                    caminho = os.path.join(pasta, nome)
+                    with open(caminho, "w") as f:
+                        f.write(codigo)
+                    arquivos.append(caminho)
+
+                inicio = time.perf_counter()
+                if modo == "servidor aquecido":
+                    ok, erros, classes = compile_daemon.compile(fontes)
+                    write_class_files(classes, pasta)
+                elif modo == "javac único":
+                    ok, erros, _ = compile_java_batch(arquivos, pasta)
+                else:
+                    for caminho in arquivos:
+                        ok, erros, _ = compile_java_batch([caminho], pasta)
+                        if not ok:
+                            break
+                if not ok:
+                    raise RuntimeError(erros)
+                tempos[modo].append(time.perf_counter() - inicio)
+            finally:
+                shutil.rmtree(pasta, ignore_errors=True)
+
+    print(f"⏱️ Latência de compilação ({rounds} rodadas, mediana):")
+    for modo, valores in tempos.items():
+        print(f"  {modo:<22} {statistics.median(valores) * 1000:8.0f} ms")
+    return {modo: statistics.median(valores) for modo, valores in tempos.items()}
+
+def benchmark_render(seconds=1):
+    """Quadros por segundo do desenho do campo de batalha em arenas de vários tamanhos (RenderBenchmark)"""
+    result = subprocess.run(["java", *cds_flags(), "-cp", ENGINE_JAR, "RenderBenchmark", str(seconds)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    print(f"⏱️ Desenho do campo de batalha ({seconds} s por medição):")
+    print(result.stdout, end="")
+    return result.stdout
+
+# Turnos por página do histórico, que fica no servidor e é montado sob demanda
+HISTORY_PAGE_TURNS = 50
+
+class BattleRecording:
+    """Saída de uma batalha indexada por turno, para montar qualquer trecho do histórico sob demanda
+
+    Guarda as linhas JSON dos turnos como o motor as escreveu (quadros-chave e deltas, bem menores que o
+    texto desenhado); cada página é decodificada a partir do quadro-chave anterior ao seu primeiro turno."""
+
+    def __init__(self, linhas):
+        self.arena = None
+        self.turns = []        # linha JSON de cada turno
+        self.keyframes = []    # índices dos turnos que são quadros-chave, em ordem
+        self.team_output = {}  # índice do turno -> prints dos times antes dele
+        self.result = None
+        for record, saida_times, linha in battle_records(linhas):
+            if record["t"] == "start":
+                self.arena = record
+            elif record["t"] == "turn":
+                if record.get("k"):
+                    self.keyframes.append(len(self.turns))
+                if saida_times:
+                    self.team_output[len(self.turns)] = saida_times
+                self.turns.append(linha)
+            elif record["t"] == "end":
+                self.result = record
+
+    @property
+    def pages(self):
+        return max(1, -(-len(self.turns) // HISTORY_PAGE_TURNS))
+
+    def page_of_turn(self, turn):
+        """Página (a partir de 0) que contém o turno `turn` (a partir de 1)"""
+        return min(max(0, (int(turn) - 1) // HISTORY_PAGE_TURNS), self.pages - 1)
+
+    def turn_texts(self, first, last):
+        """Texto dos turnos de índice first..last-1, decodificando a partir do quadro-chave anterior"""
+        chave = bisect.bisect_right(self.keyframes, first) - 1
+        inicio = self.keyframes[chave] if chave >= 0 else 0
+        decoder = BattleFrameDecoder()
+        for indice in range(inicio, last):
+            record = json.loads(self.turns[indice])
+            projeteis = decoder.decode(record)
+            if indice >= first:
+                yield render_turn(self.arena, record, projeteis, self.team_output.get(indice, ()))
+
+    def page(self, page):
+        """Texto da página `page` do histórico; a última termina com o resultado"""
+        primeiro = page * HISTORY_PAGE_TURNS
+        texto = "".join(self.turn_texts(primeiro, min(primeiro + HISTORY_PAGE_TURNS, len(self.turns))))
+        if page == self.pages - 1 and self.result:
+            texto += render_result(self.result)
+        return format_colors(texto)
+
+# Linhas de mensagens mantidas no registro da reprodução (no navegador e entre quadros descartados)
+BATTLE_LOG_LINES = 200
+
+# Renderizador da reprodução, carregado uma vez com a página. Recebe os quadros JSON de
+# paced_battle_frames pela caixa oculta #battle-frames e altera só as células e linhas que mudaram.
+BATTLE_RENDERER_JS = """
+() => {
+    const LOG_LINES = %d;
+    let estado = null;
+    // Quadro mais recente ainda não desenhado: um navegador lento pula turnos em vez de acumular atraso
+    let pendente = null;
+
+    function montar(raiz) {
+        const w = Number(raiz.dataset.w), h = Number(raiz.dataset.h);
+        const campo = raiz.querySelector(".ac-campo");
+        const linhas = [];
+        for (let y = 0; y < h; y++) {
+            const linha = document.createElement("div");
+            linha.textContent = " ".repeat(w);
+            campo.appendChild(linha);
+            linhas.push(linha);
+        }
+        return {
+            raiz, linhas,
+            simbolos: JSON.parse(raiz.dataset.s),
+            celulas: Array.from({length: h}, () => new Array(w).fill(" ")),
+            texto: linhas.map((linha) => linha.textContent),
+            ocupadas: [],
+            log: raiz.querySelector(".ac-log"),
+            status: raiz.querySelector(".ac-status"),
+        };
+    }
 
-        # Ao final, mostrar resultado destacado
-        if resultado_final:
-            # Usar função robusta para formatar cores
-            formatted_saida = format_colors(saida_completa)
+    window.airCombatRender = (mensagem) => {
+        if (!mensagem) return;
+        const quadro = JSON.parse(mensagem);
+        if (quadro.fim) {
+            requestAnimationFrame(() => {
+                const historico = document.getElementById("historico-completo");
+                if (historico) historico.scrollTop = historico.scrollHeight;
+            });
+            return;
+        }
+        const raiz = document.getElementById("battle-grid");
+        if (!raiz) return;  // o quadro seguinte traz o estado completo
+
+        // Cada quadro traz o campo inteiro: chegando outro antes do desenho, só o mais novo é desenhado,
+        // com as linhas do registro dos dois, uma vez por requestAnimationFrame
+        if (pendente && pendente.raiz === raiz) {
+            quadro.l = pendente.quadro.l.concat(quadro.l).slice(-LOG_LINES);
+            pendente.quadro = quadro;
+            return;
+        }
+        pendente = {raiz, quadro};
+        requestAnimationFrame(() => {
+            if (!pendente) return;
+            const {raiz, quadro} = pendente;
+            pendente = null;
+            desenhar(raiz, quadro);
+        });
+    };
+
+    function desenhar(raiz, quadro) {
+        if (!raiz.isConnected) return;
+        if (!estado || estado.raiz !== raiz) estado = montar(raiz);
+
+        // Limpar as células do turno anterior e marcar as novas; só as linhas tocadas são refeitas
+        const sujas = new Set();
+        estado.ocupadas.forEach(([x, y]) => { estado.celulas[y][x] = " "; sujas.add(y); });
+        const ocupadas = [];
+        const marcar = (x, y, simbolo) => { estado.celulas[y][x] = simbolo; ocupadas.push([x, y]); sujas.add(y); };
+        quadro.a.forEach(([x, y], i) => marcar(x, y, estado.simbolos[i]));
+        quadro.p.forEach(([x, y, simbolo]) => marcar(x, y, simbolo));
+        estado.ocupadas = ocupadas;
+        sujas.forEach((y) => {
+            const texto = estado.celulas[y].join("");
+            if (texto !== estado.texto[y]) {
+                estado.linhas[y].textContent = texto;
+                estado.texto[y] = texto;
+            }
+        });
+
+        const [[x1, y1], [x2, y2]] = quadro.a;
+        estado.status.textContent = `Turno ${quadro.n} | Vida Time 1: ${quadro.hp[0]} | Vida Time 2: ${quadro.hp[1]}` +
+            ` | Posições - Time 1: (${x1},${y1}) | Time 2: (${x2},${y2})`;
+
+        if (quadro.l.length) {
+            const novas = document.createDocumentFragment();
+            quadro.l.forEach((texto) => {
+                const linha = document.createElement("div");
+                linha.textContent = texto;
+                novas.appendChild(linha);
+            });
+            estado.log.appendChild(novas);
+            while (estado.log.childElementCount > LOG_LINES) estado.log.firstChild.remove();
+            estado.log.scrollTop = estado.log.scrollHeight;
+        }
+    }
+}
+""" % BATTLE_LOG_LINES
+BATTLE_RENDERER_CSS = "#battle-frames { display: none !important; }"
+
+def paced_battle_frames(linhas, pausa, first_turn=1, replay_id=None, memoized=False, unseeded=None):
+    """Gera (espera, quadro) da reprodução e, ao final, o HTML do resultado
+
+    O primeiro quadro é o HTML do campo vazio; cada turno depois dele é um dict pequeno (ver battle_frame)
+    que o renderizador do navegador aplica no campo já montado. O histórico completo não vai junto do
+    resultado: ele fica no servidor (BattleRecording) e é visto por páginas.
+
+    Um quadro por turno, no ritmo de `pausa` segundos por turno; quem consome espera `espera` segundos
+    antes de mostrar o quadro. Se o próximo quadro é pedido tarde (loop de eventos ocupado, fila do
+    Gradio atrasada) e o turno seguinte já está atrasado, o quadro do turno atual é descartado (as linhas
+    do registro dele vão no próximo), então a reprodução acompanha o relógio em vez de acumular atraso.
+    Só atrasos do lado do servidor são percebidos aqui: o Gradio pede o próximo valor assim que o anterior
+    entra na fila de envio (SSE), não quando o navegador termina de desenhá-lo. O lado do navegador fica com
+    o renderizador (BATTLE_RENDERER_JS), que desenha só o quadro mais recente a cada requestAnimationFrame.
+
+    Num replay, os turnos antes de `first_turn` só reconstroem o estado e não são mostrados. `memoized`
+    indica uma batalha servida do cache de resultados, sem rodar o JVM; `unseeded` é o trecho do código dos
+    times que sorteia ou lê o relógio fora da semente (ver unseeded_source), e o resultado avisa que a
+    semente não repete essa batalha, como faz quando o orçamento de CPU a decidiu."""
+    registro_pendente = deque(maxlen=BATTLE_LOG_LINES)  # linhas de quadros descartados
+    quadro = None
+    resultado_final = None
+    erros_times = None
+    proximo_quadro = time.monotonic()  # quando o próximo turno deve aparecer
+    enviados = descartados = 0
+
+    # Na reprodução instantânea só o resultado final é mostrado (sem quadros)
+    for tipo, conteudo in parse_battle_stream(linhas, frames=bool(pausa), text=False):
+        # Resultado final
+        if tipo == "end":
+            resultado_final = conteudo
+            continue
+        if tipo == "stderr":
+            erros_times = conteudo
+            continue
+        if tipo == "start":
+            # O campo é montado uma vez; os turnos só trocam o que mudou nele
+            yield 0, battle_grid_html(conteudo)
+            continue
+        quadro = conteudo
+        if quadro["n"] < first_turn:
+            continue
+
+        # Coalescência: se o próximo turno também já deveria estar na tela, este quadro fica de fora
+        registro_pendente.extend(quadro["l"])
+        agora = time.monotonic()
+        previsto, proximo_quadro = proximo_quadro, proximo_quadro + pausa
+        if agora > proximo_quadro:
+            descartados += 1
+            continue
+        enviados += 1
+        quadro["l"] = list(registro_pendente)
+        registro_pendente.clear()
+
+        yield previsto - agora, quadro
+
+    if pausa:
+        print(f"Reprodução: {enviados} quadros enviados, {descartados} descartados por atraso no servidor")
+
+    # Ao final, mostrar resultado destacado
+    if resultado_final:
+        vencedor = resultado_final.get("winner")
+        semente = resultado_final.get("seed")
+        if unseeded:
+            repetir = (f"(⚠️ o código dos times usa <code>{html.escape(unseeded)}</code>, fora da semente: "
+                       f"a mesma semente pode não repetir a batalha, e ela não vai para o cache de resultados)")
+        elif resultado_final.get("clock"):
+            repetir = ("(⚠️ o orçamento de CPU mudou esta batalha: o resultado depende do relógio, a mesma "
+                       "semente pode não repeti-la, e ela não vai para o cache de resultados)")
+        else:
+            repetir = "(use a mesma semente para repetir a batalha)"
+        if vencedor not in (0, 1, 2):
+            titulo, cor = "❓ Resultado desconhecido", "gray"
+        elif vencedor == 0:
+            titulo, cor = "🤝 EMPATE! 🤝", "gray"
+        else:
+            titulo, cor = f"🏆 Time {vencedor} VENCEU! 🏆", "blue" if vencedor == 1 else "red"
+        if resultado_final.get("reason"):
+            titulo += f"<br><small>{html.escape(str(resultado_final['reason']))}</small>"
+
+        final_html = f"""
+        <div>
+            <div style="padding:15px; background-color:#e9f7e9; border:2px solid #4CAF50;
+                        margin:15px 0; text-align:center; border-radius:5px;">
+                <h3 style="color:{cor}; margin:0; font-size:24px;">{titulo}</h3>
+            </div>
+            {f'<p>🎲 Semente: <code>{html.escape(str(semente))}</code> {repetir}</p>' if semente is not None else ""}
+            <p>O histórico completo está em "📜 Histórico da Batalha", abaixo, por páginas de turnos.</p>
+            {f'<p>🎬 Replay: <code>{html.escape(replay_id)}</code> (assista de novo em "🎬 Replays")</p>' if replay_id else ""}
+            {'<p>⚡ Mesmos códigos, arena e semente de uma batalha anterior: resultado servido do cache.</p>'
+             if memoized else ""}
+            {render_stderr(erros_times) if erros_times else ""}
+        </div>
+        """
 
-            vencedor = "Time 1" if "Time 1 venceu" in resultado_final else "Time 2"
-            cor = "blue" if vencedor == "Time 1" else "red"
+        yield 0, final_html
+    elif erros_times:
+        # O motor parou antes do fim; o stderr costuma explicar o motivo
+        yield 0, render_stderr(erros_times)
+
+def battle_frames(linhas, pausa, sleep=time.sleep, **kwargs):
+    """Gera cada quadro de paced_battle_frames, dormindo até a hora de cada um"""
+    for espera, quadro in paced_battle_frames(linhas, pausa, **kwargs):
+        if espera > 0:
+            sleep(espera)
+        yield quadro
+
+async def battle_frames_async(linhas, pausa, **kwargs):
+    """Como battle_frames, mas espera com asyncio.sleep, sem ocupar uma thread durante a reprodução"""
+    for espera, quadro in paced_battle_frames(linhas, pausa, **kwargs):
+        if espera > 0:
+            await asyncio.sleep(espera)
+        yield quadro
+
+def synthetic_battle_log(turns, width=200, height=7, projectiles=None):
+    """Saída do motor com `turns` turnos artificiais, para medir o consumo da reprodução"""
+    if projectiles is None:
+        projectiles = width * height // 10
+    linhas = [json.dumps({"t": "start", "v": BATTLE_PROTOCOL_VERSION, "w": width, "h": height,
+                          "s": ["▶", "◀"], "hp": [500, 500]}) + "\n"]
+    projeteis = [[i, (i * 7) % width, i % height, 0, "->" if i % 2 else "<-"] for i in range(projectiles)]
+    for n in range(1, turns + 1):
+        chave = n % KEYFRAME_INTERVAL == 1
+        linhas.append(json.dumps({"t": "turn", "n": n, **({"k": 1} if chave else {}),
+                                  "a": [[2, n % height], [width - 2, (n + 1) % height]], "hp": [500, 500],
+                                  "p": projeteis if chave else [], "x": [], "e": [["dodge", 1, 0]]}) + "\n")
+    linhas.append(json.dumps({"t": "end", "winner": 0, "reason": "teste", "turns": turns, "cpu": None}) + "\n")
+    return linhas
+
+def benchmark_format_colors(sizes_mb=(1, 4, 16)):
+    """Compara a limpeza de cores anterior (regex + 12 replaces no texto todo) com a atual"""
+    def format_colors_anterior(text):
+        text = re.sub(r'\x1b\[[0-9;]*m|\[([0-9;]*)m', '', text)
+        for codigo in ("\\u001B[31m", "\\u001B[34m", "\\u001B[32m", "\\u001B[0m",
+                       "[31m", "[34m", "[32m", "[0m"):
+            text = text.replace(codigo, "")
+        return text
+
+    # Turnos artificiais como a saída atual do motor (sem cores) e com aeronaves coloridas
+    sem_cores = [conteudo for tipo, conteudo in parse_battle_stream(synthetic_battle_log(200)) if tipo == "turn"]
+    com_cores = [turno.replace("▶", "\x1b[34m▶\x1b[0m").replace("◀", "\x1b[31m◀\x1b[0m") for turno in sem_cores]
+    print("⏱️ Limpeza de códigos de cor (MB/s):")
+    print("  texto              | anterior | format_colors")
+    resultados = {}
+    for (nome, turnos), tamanho in itertools.product((("sem cores", sem_cores), ("com cores", com_cores)), sizes_mb):
+        pedacos = []
+        total = 0
+        while total < tamanho * 1024 * 1024:
+            pedacos.append(turnos[len(pedacos) % len(turnos)])
+            total += len(pedacos[-1])
+        texto = "".join(pedacos)
+
+        tempos = {}
+        inicio = time.perf_counter()
+        esperado = format_colors_anterior(texto)
+        tempos["anterior"] = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        limpo = format_colors(texto)
+        tempos["format_colors"] = time.perf_counter() - inicio
+        if esperado != limpo:
+            raise RuntimeError("As limpezas de cor produziram textos diferentes")
+
+        vazao = {modo: total / 1024 / 1024 / duracao for modo, duracao in tempos.items()}
+        resultados[nome, tamanho] = vazao
+        print(f"  {nome}, {tamanho:>3} MB | {vazao['anterior']:8.0f} | {vazao['format_colors']:13.0f}")
+    return resultados
+
+def benchmark_streaming(sizes=(1000, 2500, 5000, 10000)):
+    """Mostra que o custo da reprodução por turno não cresce com o tamanho da batalha"""
+    print("⏱️ Reprodução de batalhas artificiais (200x7, sem pausas):")
+    resultados = {}
+    for turnos in sizes:
+        linhas = synthetic_battle_log(turnos)
+        inicio = time.perf_counter()
+        tamanhos = []
+        for quadro in battle_frames(linhas, 1, sleep=lambda _: None):
+            # Serializado como em battle_outputs, que é o que vai para o navegador
+            if isinstance(quadro, dict) and "n" in quadro:
+                tamanhos.append(len(battle_outputs(quadro)[1].encode("utf-8")))
+            else:
+                final = quadro
+        duracao = time.perf_counter() - inicio
+        resultados[turnos] = duracao / turnos
+        print(f"  {turnos:>6} turnos: {duracao * 1000:8.0f} ms ({duracao / turnos * 1e6:6.1f} µs por turno, "
+              f"{len(tamanhos)} quadros de {statistics.mean(tamanhos):.0f} bytes, final com {len(final) / 1024:.1f} KB)")
+
+        # Histórico no servidor: indexar a batalha e montar uma página do meio, como no "Ir para o turno"
+        inicio = time.perf_counter()
+        gravacao = BattleRecording(linhas)
+        indexacao = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        pagina = render_history_page(gravacao, gravacao.page_of_turn(turnos // 2))
+        print(f"          histórico: indexação {indexacao * 1000:.0f} ms, página de {HISTORY_PAGE_TURNS} turnos em "
+              f"{(time.perf_counter() - inicio) * 1000:.1f} ms ({len(pagina.encode('utf-8')) / 1024:.0f} KB)")
+
+    # A reprodução antiga enviava o texto dos últimos 5 turnos em HTML a cada quadro
+    print("  Bytes por quadro (10 projéteis): quadro JSON vs. texto dos últimos 5 turnos (formato anterior)")
+    for largura, altura in ((50, 3), (100, 5), (200, 7)):
+        linhas = synthetic_battle_log(40, largura, altura, projectiles=10)
+        textos = [conteudo.encode("utf-8") for tipo, conteudo in parse_battle_stream(linhas) if tipo == "turn"]
+        quadros = [battle_outputs(conteudo)[1].encode("utf-8")
+                   for tipo, conteudo in parse_battle_stream(linhas, frames=True) if tipo == "frame"]
+        anterior = statistics.mean(sum(map(len, textos[max(0, i - 4):i + 1])) for i in range(len(textos)))
+        print(f"    {largura:>3}x{altura}: {statistics.mean(map(len, quadros)):5.0f} vs. {anterior:5.0f}")
+    return resultados
+
+def benchmark_replay(sizes=(1000, 10000)):
+    """Mede gravar e reabrir replays de batalhas artificiais, e a mesma batalha simulada contra memorizada"""
+    if engine_ready and java_available:
+        async def combate(seed):
+            return [quadro async for quadro in run_battle(TEAM1_TEMPLATE, TEAM2_TEMPLATE, 100, 3, 2, 98, 100, 100,
+                                                          "Instantânea", seed)]
+        asyncio.run(combate(None))  # aquece o pool e o cache de classes
+        seed = battle_seed()
+        tempos = []
+        for _ in range(2):
+            inicio = time.perf_counter()
+            asyncio.run(combate(seed))
+            tempos.append(time.perf_counter() - inicio)
+        print(f"⏱️ Combate dos templates (100x3, semente {seed}): simulado {tempos[0] * 1000:.0f} ms, "
+              f"repetido do cache {tempos[1] * 1000:.0f} ms")
+
+    print("⏱️ Replays de batalhas artificiais (200x7):")
+    with tempfile.TemporaryDirectory() as pasta:
+        store = ReplayStore(pasta)
+        for turnos in sizes:
+            linhas = synthetic_battle_log(turnos)
+            bruto = sum(len(linha.encode("utf-8")) for linha in linhas)
+            inicio = time.perf_counter()
+            replay_id = store.save(linhas)
+            gravacao = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            completo = store.load(replay_id)
+            leitura = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            final = store.load(replay_id, turnos)
+            leitura_final = time.perf_counter() - inicio
+            assert completo == linhas
+            print(f"  {turnos:>6} turnos: {bruto / 1024:7.0f} KB -> {os.path.getsize(store._path(replay_id)) / 1024:5.0f} KB"
+                  f" | gravar {gravacao * 1000:5.0f} ms | abrir {leitura * 1000:5.0f} ms"
+                  f" | abrir no último turno {leitura_final * 1000:4.1f} ms ({len(final)} linhas)")
+
+def benchmark_concurrent_streams(streams=200, turns=20, pause=0.05, threads=40):
+    """Compara `streams` reproduções simultâneas em corrotinas com as mesmas reproduções em `threads` threads
+
+    `threads` é o tamanho padrão do pool de threads que o Gradio usa para funções síncronas."""
+    linhas = synthetic_battle_log(turns, 60, 3)
+    ideal = turns * pause
+
+    def consumir_sync():
+        return sum(1 for _ in battle_frames(linhas, pause))
+
+    async def consumir_async():
+        return sum([1 async for _ in battle_frames_async(linhas, pause)])
+
+    async def todas_async():
+        return await asyncio.gather(*(consumir_async() for _ in range(streams)))
+
+    print(f"⏱️ {streams} reproduções simultâneas de {turns} turnos ({ideal:.1f} s cada uma sem espera):")
+    resultados = {}
+    # O resumo impresso no fim de cada reprodução é omitido
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        inicio = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(threads) as executor:
+            list(executor.map(lambda _: consumir_sync(), range(streams)))
+        resultados["threads"] = time.perf_counter() - inicio
+
+        threads_antes = threading.active_count()
+        inicio = time.perf_counter()
+        asyncio.run(todas_async())
+        resultados["asyncio"] = time.perf_counter() - inicio
+    print(f"  {threads} threads: {resultados['threads']:6.2f} s")
+    print(f"  asyncio:    {resultados['asyncio']:6.2f} s (threads no processo: {threads_antes})")
+    return resultados
+
+# Pausa entre turnos na reprodução; o motor simula sem pausas e libera o JVM logo
+PLAYBACK_SPEEDS = {
+    "Lenta": 1.0,
+    "Normal": 0.5,
+    "Rápida": 0.15,
+    "Instantânea": 0,
+}
+DEFAULT_PLAYBACK_SPEED = "Normal"
+
+battle_slots = {}  # um semáforo por loop de eventos
+
+def battle_slot():
+    """Semáforo que limita compilação e simulação simultâneas a BATTLE_CONCURRENCY (a reprodução não conta)"""
+    loop = asyncio.get_running_loop()
+    if loop not in battle_slots:
+        battle_slots[loop] = asyncio.Semaphore(BATTLE_CONCURRENCY)
+    return battle_slots[loop]
+
+async def compile_and_simulate(code1, code2, args):
+    """Compila os times e simula a batalha numa pasta própria; devolve (linhas, None) ou (None, erro em HTML)
+
+    As etapas bloqueantes (reservar a pasta, compilar) rodam em threads; a simulação é lida pelo loop de
+    eventos. A pasta e o JVM são liberados antes da reprodução começar."""
+    loop = asyncio.get_running_loop()
+    async with battle_slot():
+        # Cada batalha usa sua própria pasta, permitindo várias batalhas ao mesmo tempo
+        try:
+            workspace = await loop.run_in_executor(None, workspaces.create)
+        except WorkspaceBudgetExceeded as e:
+            return None, f"⚠ Servidor ocupado: {str(e)}"
+
+        battle = None
+        try:
+            # Compilar apenas as aeronaves dos times; o motor já foi compilado na inicialização
+            ok, erros, tempo = await loop.run_in_executor(None, compile_with_cache, {
+                "Team1Aircraft.java": code1,
+                "Team2Aircraft.java": code2,
+            }, workspace, ENGINE_JAR)
+            stats = class_cache.stats()
+            print(f"⏱️ Compilação da batalha: {tempo * 1000:.0f} ms "
+                  f"(cache de classes: {stats['hits']} acertos, {stats['misses']} falhas)")
+            if not ok:
+                return None, format_compile_errors(erros)
+            workspaces.check_quota(workspace)
+
+            # Executar a simulação (JVM aquecido do pool ou JVM avulso) de uma vez
+            battle = simulate_battle_async(workspace, args)
+            inicio = time.perf_counter()
+            linhas = [linha async for linha in battle]
+            print(f"⏱️ Simulação da batalha: {(time.perf_counter() - inicio) * 1000:.0f} ms ({len(linhas)} linhas)")
+            return linhas, None
+        finally:
+            if battle is not None:
+                await battle.aclose()
+            workspaces.release(workspace)
+
+async def run_battle(code1, code2, screen_width, battlefield_height, p1_start_pos, p2_start_pos, team1_health, team2_health,
+               playback_speed=DEFAULT_PLAYBACK_SPEED, seed=None):
+    # Verificar se Java está disponível
+    if not java_available:
+        yield f"""
+        <div style="padding:20px; background-color:#ffe6e6; border:2px solid #ff4444; border-radius:5px; margin:10px;">
+            <h3 style="color:#cc0000;">❌ Java não está disponível</h3>
+            <p>Este aplicativo requer Java para compilar e executar as aeronaves.</p>
+            <p><strong>Soluções:</strong></p>
+            <ul>
+                <li>Execute localmente com Java instalado</li>
+                <li>Use um ambiente Docker com Java</li>
+                <li>Aguarde enquanto tentamos instalar Java automaticamente...</li>
+            </ul>
+            <p><em>Status: {java_message}</em></p>
+        </div>
+        """
+        return
+    
+    if not engine_ready:
+        yield format_compile_errors(engine_errors)
+        return
 
-            final_scroll_js = """
-            <script>
-            (function() {
-                function finalForceScroll() {
-                    const container = document.querySelector('#historico-completo');
-                    if (container) {
-                        container.scrollTop = container.scrollHeight * 20;
-                    }
-                }
-                finalForceScroll();
-                for (let i = 1; i <= 20; i++) {
-                    setTimeout(finalForceScroll, i * 100);
-                }
-                const scrollInterval = setInterval(finalForceScroll, 200);
-                setTimeout(() => { clearInterval(scrollInterval); }, 5000);
-            })();
-            </script>
-            """
+    try:
+        seed = battle_seed(seed)
+    except (TypeError, ValueError, OverflowError) as e:
+        yield f"""
+        <div style="padding:20px; background-color:#ffe6e6; border:2px solid #ff4444; border-radius:5px; margin:10px;">
+            <h3 style="color:#cc0000;">❌ Semente inválida</h3>
+            <p>{html.escape(str(e))}</p>
+        </div>
+        """
+        return
 
-            final_html = f"""
-            <div>
-                <div style="padding:15px; background-color:#e9f7e9; border:2px solid #4CAF50;
-                            margin:15px 0; text-align:center; border-radius:5px;">
-                    <h3 style="color:{cor}; margin:0; font-size:24px;">🏆 {vencedor} VENCEU! 🏆</h3>
-                </div>
+    try:
+        loop = asyncio.get_running_loop()
+        args = battle_args(screen_width, battlefield_height, p1_start_pos, p2_start_pos, team1_health, team2_health,
+                           seed=seed)
+
+        # Mesmos códigos, arena e semente de uma batalha já simulada: o resultado vem do replay gravado.
+        # Código que sorteia ou lê o relógio por conta própria não repete a batalha e não é memorizado.
+        imprevisivel = unseeded_source(code1) or unseeded_source(code2)
+        chave = None if imprevisivel else replay_store.battle_key(code1, code2, args)
+        replay_id = replay_store.lookup(chave) if chave else None
+        linhas = await loop.run_in_executor(None, replay_store.load, replay_id) if replay_id else None
+        memorizada = linhas is not None
+        if memorizada:
+            stats = replay_store.stats()
+            print(f"⏱️ Batalha memorizada: replay {replay_id} (cache de resultados: {stats['hits']} acertos, "
+                  f"{stats['misses']} falhas, {stats['memoized']} batalhas, {stats['bytes'] / 1024 / 1024:.1f} MB)")
+        else:
+            linhas, erro = await compile_and_simulate(code1, code2, args)
+            if erro:
+                yield erro
+                return
+
+            # Gravar o replay; sem disco livre a batalha ainda é mostrada, só não pode ser reassistida
+            try:
+                replay_id = await loop.run_in_executor(None, replay_store.save, linhas, chave)
+            except OSError as e:
+                print(f"Replay não gravado: {e}")
+                replay_id = None
+        pausa = PLAYBACK_SPEEDS.get(playback_speed, PLAYBACK_SPEEDS[DEFAULT_PLAYBACK_SPEED])
+
+        async for quadro in battle_frames_async(linhas, pausa, replay_id=replay_id, memoized=memorizada,
+                                                unseeded=imprevisivel):
+            yield quadro
+
+        # Histórico completo no servidor; a interface mostra a última página
+        yield BattleRecording(linhas)
+        # O renderizador rola o histórico até o fim, uma vez, depois que o HTML está na página
+        yield {"fim": 1}
 
-                <h4>Histórico Completo da Batalha:</h4>
+    except Exception as e:
+        yield f"⚠ Erro inesperado: {str(e)}"
 
-                <div id="historico-completo" style="height:500px; overflow:auto; border:1px solid #ccc; padding:10px;
-                           font-family:monospace; white-space:pre; background-color:#f8f8f8;">
-                    {formatted_saida}
-                </div>
-                {final_scroll_js}
+async def run_replay(replay_id, playback_speed=DEFAULT_PLAYBACK_SPEED, first_turn=1):
+    """Reproduz uma batalha gravada a partir de `first_turn`, sem compilar nem rodar o JVM"""
+    try:
+        first_turn = max(1, int(first_turn or 1))
+        loop = asyncio.get_running_loop()
+        linhas = await loop.run_in_executor(None, replay_store.load, replay_id or "", first_turn)
+        if linhas is None:
+            yield f"""
+            <div style="padding:20px; background-color:#ffe6e6; border:2px solid #ff4444; border-radius:5px; margin:10px;">
+                <h3 style="color:#cc0000;">❌ Replay não encontrado</h3>
+                <p>O replay <code>{html.escape(str(replay_id))}</code> não existe ou já foi removido para liberar espaço.</p>
             </div>
             """
+            return
+        pausa = PLAYBACK_SPEEDS.get(playback_speed, PLAYBACK_SPEEDS[DEFAULT_PLAYBACK_SPEED])
+
+        async for quadro in battle_frames_async(linhas, pausa, first_turn=first_turn,
+                                                replay_id=replay_id.strip().lower()):
+            yield quadro
 
-            yield final_html
+        # O histórico paginado é sempre o da batalha inteira
+        if first_turn > 1:
+            linhas = await loop.run_in_executor(None, replay_store.load, replay_id)
+        if linhas is not None:
+            yield BattleRecording(linhas)
+            yield {"fim": 1}
 
     except Exception as e:
         yield f"⚠ Erro inesperado: {str(e)}"
@@ -930,16 +4013,32 @@ def load_team1_template():
 def load_team2_template():
     return TEAM2_TEMPLATE
 
+def battle_outputs(quadro):
+    """Valores das saídas da batalha (HTML, quadro JSON, gravação, página do histórico, número da página)
+
+    As saídas que não mudam recebem gr.update()."""
+    if isinstance(quadro, BattleRecording):
+        ultima = quadro.pages - 1
+        return gr.update(), gr.update(), quadro, render_history_page(quadro, ultima), ultima
+    if isinstance(quadro, dict):
+        return gr.update(), json.dumps(quadro, ensure_ascii=False, separators=(",", ":")), *[gr.update()] * 3
+    return quadro, *[gr.update()] * 4
+
 # Função para preparar e executar a batalha
-def prepare_battle(code1, code2, width, height, p1_pos, p2_auto, p2_pos, t1_health, t2_health):
+async def prepare_battle(code1, code2, width, height, p1_pos, p2_auto, p2_pos, t1_health, t2_health,
+                   speed=DEFAULT_PLAYBACK_SPEED, seed=None):
     # Se a posição do Time 2 é automática, calcule-a com base na largura
     final_p2_pos = width - 2 if p2_auto else p2_pos
     # Executar a simulação e retornar o iterador
-    for output in run_battle(code1, code2, width, height, p1_pos, final_p2_pos, t1_health, t2_health):
-        yield output
+    async for output in run_battle(code1, code2, width, height, p1_pos, final_p2_pos, t1_health, t2_health, speed, seed):
+        yield battle_outputs(output)
+
+async def prepare_replay(replay_id, first_turn, speed=DEFAULT_PLAYBACK_SPEED):
+    async for output in run_replay(replay_id, speed, first_turn):
+        yield battle_outputs(output)
 
 # Interface Gradio
-with gr.Blocks(title="Java Air Combat", theme=gr.themes.Soft()) as app:
+with gr.Blocks(title="Java Air Combat", theme=gr.themes.Soft(), js=BATTLE_RENDERER_JS, css=BATTLE_RENDERER_CSS) as app:
     gr.Markdown("# ⯐🛦🛧 JAVA-Aircraft-Combat - Time 1 vs Time 2")
 
     gr.Markdown("""
@@ -1007,6 +4106,14 @@ with gr.Blocks(title="Java Air Combat", theme=gr.themes.Soft()) as app:
 
         screen_width.change(update_p2_pos, inputs=screen_width, outputs=p2_start_pos)
 
+        with gr.Row():
+            playback_speed = gr.Radio(choices=list(PLAYBACK_SPEEDS), value=DEFAULT_PLAYBACK_SPEED,
+                                      label="⏩ Velocidade da Reprodução",
+                                      info="A batalha é simulada de uma vez; isto só controla a exibição dos turnos")
+            battle_seed_box = gr.Number(label="🎲 Semente", value=None, precision=0, minimum=0,
+                                        maximum=BATTLE_SEED_LIMIT - 1,
+                                        info="Vazia: sorteada a cada combate. A mesma semente repete a batalha")
+
     btn = gr.Button("🔥 Combate!", variant="primary", size="lg")
     
     # Configurar o componente HTML
@@ -1022,13 +4129,83 @@ with gr.Blocks(title="Java Air Combat", theme=gr.themes.Soft()) as app:
     """
 
     output = gr.HTML(label="Resultado do Combate", elem_id="battle-result", value=css)
+    # Quadros JSON de cada turno, aplicados no navegador pelo BATTLE_RENDERER_JS (caixa escondida via CSS)
+    battle_frames_box = gr.Textbox(elem_id="battle-frames", interactive=False, show_label=False)
+    battle_frames_box.change(fn=None, inputs=battle_frames_box, js="(quadro) => window.airCombatRender(quadro)")
+
+    # Histórico guardado no servidor (na sessão) e enviado uma página de turnos por vez
+    battle_recording = gr.State(None)
+    history_page = gr.State(0)
+    with gr.Accordion("📜 Histórico da Batalha", open=True):
+        with gr.Row():
+            history_first_btn = gr.Button("⏮ Início", size="sm")
+            history_prev_btn = gr.Button("◀ Anterior", size="sm")
+            history_next_btn = gr.Button("Próxima ▶", size="sm")
+            history_last_btn = gr.Button("Fim ⏭", size="sm")
+            history_turn = gr.Number(label="Ir para o turno", precision=0, minimum=1)
+            history_go_btn = gr.Button("Ir", size="sm")
+        history_view = gr.HTML()
+
+    # Batalhas já terminadas, reproduzidas do disco (o ID aparece no resultado de cada combate)
+    with gr.Accordion("🎬 Replays", open=False):
+        with gr.Row():
+            replay_id_box = gr.Textbox(label="ID do Replay", placeholder="ex.: 3f9a1c0b7d2e4a65")
+            replay_turn = gr.Number(label="Começar no turno", value=1, precision=0, minimum=1)
+            replay_btn = gr.Button("▶️ Assistir Replay", variant="secondary")
+        with gr.Row():
+            replay_stats_view = gr.Markdown()
+            replay_stats_btn = gr.Button("🔄 Atualizar estatísticas", size="sm")
+
+    def replay_stats_markdown():
+        stats = replay_store.stats()
+        return (f"**Replays:** {stats['entries']} gravados ({stats['bytes'] / 1024 / 1024:.1f} MB) · "
+                f"**Cache de resultados:** {stats['memoized']} batalhas, {stats['hits']} acertos, "
+                f"{stats['misses']} falhas")
+
+    def show_history_page(recording, page):
+        if recording is None:
+            return "", 0
+        page = min(max(0, int(page)), recording.pages - 1)
+        return render_history_page(recording, page), page
+
+    def history_first(recording):
+        return show_history_page(recording, 0)
+
+    def history_prev(recording, page):
+        return show_history_page(recording, page - 1)
+
+    def history_next(recording, page):
+        return show_history_page(recording, page + 1)
+
+    def history_last(recording):
+        return show_history_page(recording, recording.pages - 1 if recording else 0)
+
+    def history_jump(recording, turn):
+        if recording is None or turn is None:
+            return show_history_page(recording, 0)
+        return show_history_page(recording, recording.page_of_turn(turn))
+
+    history_outputs = [history_view, history_page]
+    history_first_btn.click(history_first, inputs=battle_recording, outputs=history_outputs)
+    history_prev_btn.click(history_prev, inputs=[battle_recording, history_page], outputs=history_outputs)
+    history_next_btn.click(history_next, inputs=[battle_recording, history_page], outputs=history_outputs)
+    history_last_btn.click(history_last, inputs=battle_recording, outputs=history_outputs)
+    history_go_btn.click(history_jump, inputs=[battle_recording, history_turn], outputs=history_outputs)
+    history_turn.submit(history_jump, inputs=[battle_recording, history_turn], outputs=history_outputs)
     
     # Conectar o botão à função
     btn.click(fn=prepare_battle,
               inputs=[team1_code, team2_code, screen_width, battlefield_height,
                      p1_start_pos, p2_start_pos_auto, p2_start_pos,
-                     team1_health, team2_health],
-              outputs=output)
+                     team1_health, team2_health, playback_speed, battle_seed_box],
+              outputs=[output, battle_frames_box, battle_recording, history_view, history_page],
+              concurrency_limit=STREAM_CONCURRENCY).then(replay_stats_markdown, outputs=replay_stats_view)
+    replay_btn.click(fn=prepare_replay,
+                     inputs=[replay_id_box, replay_turn, playback_speed],
+                     outputs=[output, battle_frames_box, battle_recording, history_view, history_page],
+                     concurrency_limit=STREAM_CONCURRENCY).then(replay_stats_markdown, outputs=replay_stats_view)
+    replay_stats_btn.click(replay_stats_markdown, outputs=replay_stats_view)
+    app.load(replay_stats_markdown, outputs=replay_stats_view)
 
     # Adicionar informações de rodapé
     gr.Markdown("""
@@ -1045,4 +4222,27 @@ with gr.Blocks(title="Java Air Combat", theme=gr.themes.Soft()) as app:
     """)
 
 if __name__ == "__main__":
-    app.launch()
\ No newline at end of file
+    if BUILD_ENGINE_ONLY:
+        # O jar já foi gerado (ou validado) ao importar o módulo
+        if not engine_ready:
+            print(engine_errors)
+        sys.exit(0 if engine_ready else 1)
+    elif "--bench-compile" in sys.argv:
+        benchmark_compilation()
+    elif "--bench-colors" in sys.argv:
+        benchmark_format_colors()
+    elif "--bench-streaming" in sys.argv:
+        benchmark_streaming()
+    elif "--bench-async" in sys.argv:
+        benchmark_concurrent_streams()
+    elif "--bench-replay" in sys.argv:
+        benchmark_replay()
+    elif "--bench-headless" in sys.argv:
+        benchmark_headless()
+    elif "--bench-render" in sys.argv:
+        benchmark_render()
+    elif "--bench-startup" in sys.argv:
+        build_cds_archive()
+        benchmark_startup()
+    else:
+        app.launch()
\ No newline at end of file